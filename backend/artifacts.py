@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+
+# A bundle is a directory holding one .npy file per forest array plus a
+# manifest.json with the encoder classes and metadata. The .npy files are
+# opened with mmap_mode="r", so every worker on the host shares a single
+# page-cache copy of the forest instead of unpickling a private one.
+# A bundle may also hold the neighborhood map built with its encoders, so
+# /options always matches the version being served.
+#
+# NumPy and forest are imported inside save_bundle/load_bundle, so the API
+# can import this module (via registry) without paying for NumPy until the
+# model is actually loaded.
+MANIFEST_NAME = "manifest.json"
+MAP_NAME = "neighborhood_map.json"
+FORMAT_VERSION = 1
+
+
+def build_manifest(forest, label_encoders, metadata):
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "feature_names": list(metadata["feature_names"]),
+        "target_column": metadata.get("target_column"),
+        "encoders": {name: [str(c) for c in encoder.classes_] for name, encoder in label_encoders.items()},
+        "forest": {"max_depth": forest.max_depth, "arrays": {name: f"{name}.npy" for name in forest.arrays()}},
+    }
+    if forest.value_scale is not None:
+        manifest["forest"]["value_scale"] = float(forest.value_scale)
+        manifest["forest"]["value_offset"] = float(forest.value_offset)
+    return manifest
+
+
+def content_digest(forest, label_encoders, metadata, mapping=None):
+    """sha256 of everything a bundle serves (manifest, array contents, map), without writing it"""
+    import numpy as np
+
+    digest = hashlib.sha256(json.dumps(build_manifest(forest, label_encoders, metadata), sort_keys=True).encode())
+    for name, array in sorted(forest.arrays().items()):
+        array = np.ascontiguousarray(array)
+        digest.update(f"{name}|{array.dtype.str}|{array.shape}".encode())
+        digest.update(array.data)
+    if mapping is not None:
+        digest.update(json.dumps(mapping, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def read_manifest(bundle_dir):
+    with open(os.path.join(bundle_dir, MANIFEST_NAME)) as f:
+        return json.load(f)
+
+
+def bundle_map_path(bundle_dir):
+    """The bundle's neighborhood map, or None when it was saved without one"""
+    path = os.path.join(bundle_dir, MAP_NAME)
+    return path if os.path.exists(path) else None
+
+
+def save_bundle(bundle_dir, forest, label_encoders, metadata, mapping=None):
+    """Write a bundle, replacing any existing one at bundle_dir"""
+    import numpy as np
+
+    tmp_dir = bundle_dir.rstrip(os.sep) + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    manifest = build_manifest(forest, label_encoders, metadata)
+    for name, array in forest.arrays().items():
+        np.save(os.path.join(tmp_dir, manifest["forest"]["arrays"][name]), np.ascontiguousarray(array))
+    manifest["content_digest"] = content_digest(forest, label_encoders, metadata, mapping)
+    with open(os.path.join(tmp_dir, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f)
+    if mapping is not None:
+        with open(os.path.join(tmp_dir, MAP_NAME), "w") as f:
+            json.dump(mapping, f)
+
+    # Swap the finished directory into place so readers never see a partial bundle
+    old_dir = bundle_dir.rstrip(os.sep) + ".old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(bundle_dir):
+        os.rename(bundle_dir, old_dir)
+    os.rename(tmp_dir, bundle_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def load_bundle(bundle_dir, mmap=True):
+    """Return (forest, encoder classes by feature, metadata) from a bundle"""
+    import numpy as np
+    from forest import FlatForest
+
+    manifest = read_manifest(bundle_dir)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported bundle format: {manifest.get('format_version')}")
+
+    mmap_mode = "r" if mmap else None
+    arrays = {
+        name: np.load(os.path.join(bundle_dir, filename), mmap_mode=mmap_mode)
+        for name, filename in manifest["forest"]["arrays"].items()
+    }
+    forest = FlatForest(
+        max_depth=manifest["forest"]["max_depth"],
+        value_scale=manifest["forest"].get("value_scale"),
+        value_offset=manifest["forest"].get("value_offset"),
+        **arrays,
+    )
+    metadata = {
+        "feature_names": manifest["feature_names"],
+        "target_column": manifest["target_column"],
+    }
+    return forest, manifest["encoders"], metadata
+
+
+def bundle_exists(bundle_dir):
+    return os.path.exists(os.path.join(bundle_dir, MANIFEST_NAME))
+
+
+if __name__ == "__main__":
+    # Build a bundle from the legacy joblib pickles
+    import joblib
+    from forest import export_forest
+
+    models_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+    bundle_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(models_dir, "bundle")
+    model = joblib.load(os.path.join(models_dir, "model.pkl"))
+    label_encoders = joblib.load(os.path.join(models_dir, "label_encoders.pkl"))
+    metadata = joblib.load(os.path.join(models_dir, "metadata.pkl"))
+    save_bundle(bundle_dir, export_forest(model), label_encoders, metadata)
+    print(f"Bundle written to {bundle_dir}")
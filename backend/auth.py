@@ -1,15 +1,37 @@
 from datetime import datetime, timedelta
 from typing import Optional
-from jose import JWTError, jwt
 import bcrypt
+import hashlib
+import time
 
 import os
 
+from cache import LRUTTLCache
+
 # Configuration
 SECRET_KEY = os.environ.get("SECRET_KEY", "your-secret-key-for-development") 
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Validated tokens and the users they resolve to are cached per worker, so hot
+# tokens skip both HMAC verification and the users-table query. Principals
+# expire after AUTH_CACHE_TTL seconds, which bounds how long another worker's
+# change to a user can go unseen here.
+AUTH_CACHE_SIZE = int(os.environ.get("AUTH_CACHE_SIZE", 10000))
+AUTH_CACHE_TTL = float(os.environ.get("AUTH_CACHE_TTL", 60))
+
+claims_cache = LRUTTLCache(AUTH_CACHE_SIZE, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+principal_cache = LRUTTLCache(AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)
+
+class CurrentUser:
+    """Detached snapshot of the authenticated user, safe to share across requests"""
+    __slots__ = ("id", "username", "email")
+
+    def __init__(self, id: int, username: str, email: str):
+        self.id = id
+        self.username = username
+        self.email = email
+
 def verify_password(plain_password: str, hashed_password: str):
     return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
 
@@ -18,6 +40,9 @@ def get_password_hash(password: str):
     return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    # python-jose (and its crypto backends) cost ~50 ms to import; the first login pays for it
+    from jose import jwt
+
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -26,3 +51,25 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
+
+def decode_access_token(token: str) -> dict:
+    """jwt.decode, memoized per token until the token expires"""
+    key = hashlib.sha256(token.encode('utf-8')).digest()
+    claims = claims_cache.get(key)
+    if claims is None:
+        from jose import JWTError, jwt
+
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        exp = claims.get("exp")
+        if exp is not None:
+            remaining = exp - time.time()
+            if remaining <= 0:
+                raise JWTError("Signature has expired.")
+            claims_cache.set(key, claims, ttl=min(remaining, claims_cache.ttl))
+        else:
+            claims_cache.set(key, claims)
+    return claims
+
+def invalidate_user(username: str):
+    """Drop a cached principal after the user row is created or changed"""
+    principal_cache.pop(username)
@@ -0,0 +1,97 @@
+"""Latency under concurrent login + predict traffic against an in-process app.
+
+Runs the FastAPI app through one TestClient (one event loop, as in a single
+uvicorn worker) on a throwaway SQLite file and fires /token and /predict
+requests from many client threads at once. Any blocking call on the event
+loop shows up as inflated /predict latency while bcrypt runs.
+
+Every /predict body is a different synthetic listing (random city,
+neighborhood, type, size, beds and baths from the served model's
+vocabulary), so the prediction cache almost never hits and each request
+pays for encoding and scoring.
+
+    python benchmarks/bench_concurrency.py --clients 16 --requests 400
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from synthetic import ListingGenerator
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return None
+    index = min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def summarize(latencies):
+    return {
+        "count": len(latencies),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": max(latencies) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--login-ratio", type=float, default=0.1, help="share of requests that hit /token")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the synthetic /predict bodies")
+    args = parser.parse_args()
+    bodies = ListingGenerator(args.seed).requests(args.requests)
+
+    warnings.filterwarnings("ignore")
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["MODEL_LOAD_IN_BACKGROUND"] = "false"
+    os.chdir(BACKEND_DIR)
+    from fastapi.testclient import TestClient
+    import main as backend
+
+    with TestClient(backend.app) as client:
+        client.post("/register", json={"username": "bench", "email": "bench@example.com", "password": "bench"})
+        token = client.post("/token", data={"username": "bench", "password": "bench"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        login_every = max(1, round(1 / args.login_ratio)) if args.login_ratio > 0 else 0
+        latencies = {"token": [], "predict": []}
+
+        def one(i):
+            start = time.perf_counter()
+            if login_every and i % login_every == 0:
+                response = client.post("/token", data={"username": "bench", "password": "bench"})
+                kind = "token"
+            else:
+                response = client.post("/predict", json=bodies[i], headers=headers)
+                kind = "predict"
+            response.raise_for_status()
+            latencies[kind].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.clients) as pool:
+            list(pool.map(one, range(args.requests)))
+        elapsed = time.perf_counter() - start
+
+    results = {
+        "clients": args.clients,
+        "requests": args.requests,
+        "throughput_rps": args.requests / elapsed,
+        **{kind: summarize(values) for kind, values in latencies.items() if values},
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
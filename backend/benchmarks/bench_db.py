@@ -0,0 +1,107 @@
+"""Concurrent read/write throughput on a local SQLite file, per engine config.
+
+Each worker thread mixes single-row history inserts (one commit each, like
+the synchronous fallback path) with /history-style page reads, through the
+configured engine and SessionLocal. Reports throughput, latency and lock
+errors, and with --compare also runs the pre-tuning settings (rollback
+journal, synchronous=FULL) in a subprocess.
+
+    python benchmarks/bench_db.py --threads 16 --ops 200 --compare
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+LEGACY_ENV = {"SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_SYNCHRONOUS": "FULL"}
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))] if values else None
+
+
+def run(threads, ops, write_ratio):
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    from database import SessionLocal, Prediction, init_db, pool_stats
+
+    init_db()
+    latencies = {"write": [], "read": []}
+    errors = []
+    lock = threading.Lock()
+    write_every = max(1, round(1 / write_ratio))
+
+    def worker(worker_id):
+        for i in range(ops):
+            kind = "write" if i % write_every == 0 else "read"
+            start = time.perf_counter()
+            db = SessionLocal()
+            try:
+                if kind == "write":
+                    db.add(Prediction(
+                        city="Bangalore", neighborhood="Whitefield", beds=3, baths=2, size="1200 sqft",
+                        property_type="Apartment", predicted_price=1e7, timestamp=datetime.utcnow(),
+                        owner_id=worker_id,
+                    ))
+                    db.commit()
+                else:
+                    db.query(Prediction.id, Prediction.predicted_price).filter(
+                        Prediction.owner_id == worker_id
+                    ).order_by(Prediction.timestamp.desc()).limit(50).all()
+            except Exception as e:
+                with lock:
+                    errors.append(str(e).splitlines()[0])
+                continue
+            finally:
+                db.close()
+            with lock:
+                latencies[kind].append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "journal_mode": os.environ.get("SQLITE_JOURNAL_MODE", "WAL"),
+        "synchronous": os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+        "threads": threads,
+        "ops_per_s": sum(len(v) for v in latencies.values()) / elapsed,
+        "write_p99_ms": (percentile(latencies["write"], 99) or 0) * 1000,
+        "read_p99_ms": (percentile(latencies["read"], 99) or 0) * 1000,
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "pool": pool_stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--ops", type=int, default=200, help="operations per thread")
+    parser.add_argument("--write-ratio", type=float, default=0.3)
+    parser.add_argument("--compare", action="store_true", help="also run the legacy SQLite settings")
+    args = parser.parse_args()
+
+    results = [run(args.threads, args.ops, args.write_ratio)]
+    if args.compare:
+        command = [sys.executable, os.path.abspath(__file__), "--threads", str(args.threads),
+                   "--ops", str(args.ops), "--write-ratio", str(args.write_ratio)]
+        output = subprocess.run(command, env={**os.environ, **LEGACY_ENV}, capture_output=True, text=True, check=True)
+        results.extend(json.loads(output.stdout))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
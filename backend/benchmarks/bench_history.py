@@ -0,0 +1,100 @@
+"""/history latency for a user with a large prediction history.
+
+Seeds a throwaway SQLite file with --rows predictions for one user (plus
+noise rows for other users), then times the first /history page and a
+walk through the next pages via their cursors.
+
+    python benchmarks/bench_history.py --rows 50000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import warnings
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def seed(engine, owner_id, n_rows, other_users=5):
+    from sqlalchemy import insert
+    from database import Prediction
+
+    start = datetime(2024, 1, 1)
+    rng = random.Random(0)
+    rows = []
+    for i in range(n_rows * (1 + other_users) // 2):
+        rows.append({
+            "city": "Bangalore", "neighborhood": "Whitefield", "beds": 3, "baths": 2,
+            "size": "1200 sqft", "property_type": "Apartment",
+            "predicted_price": rng.uniform(1e6, 1e8),
+            "timestamp": start + timedelta(seconds=rng.randint(0, 365 * 86400)),
+            "owner_id": owner_id if i < n_rows else owner_id + 1 + i % other_users,
+        })
+    with engine.begin() as conn:
+        conn.execute(insert(Prediction), rows)
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return min(samples) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore")
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.chdir(BACKEND_DIR)
+    from fastapi.testclient import TestClient
+    import main as backend
+    from database import engine
+
+    with TestClient(backend.app) as client:
+        client.post("/register", json={"username": "bench", "email": "bench@example.com", "password": "bench"})
+        token = client.post("/token", data={"username": "bench", "password": "bench"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        owner_id = backend.find_user(backend.SessionLocal(), username="bench").id
+
+        start = time.perf_counter()
+        seed(engine, owner_id, args.rows)
+        seed_s = time.perf_counter() - start
+
+        first_ms, response = timed(lambda: client.get("/history", headers=headers), args.repeat)
+        results = {
+            "rows": args.rows,
+            "seed_s": seed_s,
+            "first_page_ms": first_ms,
+            "first_page_rows": len(response.json()),
+            "first_page_bytes": len(response.content),
+        }
+
+        cursor = response.headers.get("x-next-cursor")
+        if cursor:
+            page_times = []
+            for _ in range(args.pages):
+                if not cursor:
+                    break
+                ms, response = timed(lambda: client.get("/history", params={"cursor": cursor}, headers=headers), 1)
+                page_times.append(ms)
+                cursor = response.headers.get("x-next-cursor")
+            results["next_pages"] = len(page_times)
+            results["next_page_mean_ms"] = sum(page_times) / len(page_times)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
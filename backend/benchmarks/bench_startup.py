@@ -0,0 +1,117 @@
+"""Cold-start time and per-worker memory: joblib pickles vs the mmap bundle.
+
+Spawns N worker processes per format, each loading the artifacts the way
+startup_event does and scoring a warm-up batch, then reads RSS and PSS for
+every live worker from /proc. PSS splits shared pages between the processes
+mapping them, so it shows what each extra worker really costs.
+
+    python benchmarks/bench_startup.py --workers 4
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+MODELS_DIR = os.path.join(BACKEND_DIR, "models")
+
+
+def run_worker(fmt):
+    import warnings
+    warnings.filterwarnings("ignore")
+
+    start = time.perf_counter()
+    if fmt == "pickle":
+        import joblib
+        model = joblib.load(os.path.join(MODELS_DIR, "model.pkl"))
+        joblib.load(os.path.join(MODELS_DIR, "label_encoders.pkl"))
+        metadata = joblib.load(os.path.join(MODELS_DIR, "metadata.pkl"))
+        import_and_load = time.perf_counter() - start
+        load_only = None
+    else:
+        import numpy  # noqa: F401 - imported up front so load_only excludes it
+        from artifacts import load_bundle
+        load_start = time.perf_counter()
+        model, _, metadata = load_bundle(os.path.join(MODELS_DIR, "bundle"))
+        import_and_load = time.perf_counter() - start
+        load_only = time.perf_counter() - load_start
+
+    import numpy as np
+    rng = np.random.default_rng(0)
+    X = rng.integers(0, 160, size=(1000, len(metadata["feature_names"])))
+    model.predict(X)
+
+    print(json.dumps({"import_and_load_s": import_and_load, "load_only_s": load_only}), flush=True)
+    sys.stdin.read()
+
+
+def proc_memory_kb(pid):
+    stats = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                stats["rss_kb"] = int(line.split()[1])
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Pss:"):
+                stats["pss_kb"] = int(line.split()[1])
+    return stats
+
+
+def bench_format(fmt, n_workers):
+    workers = [
+        subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--worker", fmt],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+        )
+        for _ in range(n_workers)
+    ]
+    try:
+        timings = [json.loads(w.stdout.readline()) for w in workers]
+        memory = [proc_memory_kb(w.pid) for w in workers]
+    finally:
+        for w in workers:
+            w.stdin.close()
+            w.wait()
+
+    def mean(values):
+        values = list(values)
+        return sum(values) / len(values) if values else None
+
+    return {
+        "format": fmt,
+        "workers": n_workers,
+        "import_and_load_ms": mean(t["import_and_load_s"] for t in timings) * 1000,
+        "load_only_ms": mean(t["load_only_s"] * 1000 for t in timings if t["load_only_s"] is not None),
+        "rss_mb_per_worker": mean(m["rss_kb"] for m in memory) / 1024,
+        "pss_mb_per_worker": mean(m["pss_kb"] for m in memory) / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--worker", choices=["pickle", "bundle"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker)
+        return
+
+    if not os.path.exists(os.path.join(MODELS_DIR, "bundle", "manifest.json")):
+        sys.exit("No bundle found: run 'python artifacts.py' first")
+
+    results = [bench_format(fmt, args.workers) for fmt in ("pickle", "bundle")]
+    for r in results:
+        load_only = f", load only {r['load_only_ms']:.1f} ms" if r["load_only_ms"] is not None else ""
+        print(f"{r['format']:>6}: import+load {r['import_and_load_ms']:.1f} ms{load_only}, "
+              f"RSS {r['rss_mb_per_worker']:.1f} MB, PSS {r['pss_mb_per_worker']:.1f} MB per worker "
+              f"({r['workers']} workers)")
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
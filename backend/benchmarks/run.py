@@ -0,0 +1,349 @@
+"""Benchmark suite for the API and training hot paths, with regression checks.
+
+Runs the FastAPI app in-process through TestClient on a throwaway SQLite
+file, with requests from benchmarks/synthetic.py, and times:
+
+    predict_single      sequential /predict, cold (distinct rows) and cached
+    predict_concurrent  /predict from many client threads at once
+    predict_batch       one /predict/batch call
+    predict_curve       one /predict/curve size x beds x baths sweep
+    options             /options full body and 304 revalidation
+    history             /history first page and cursor pages over a large history
+    token               /token (bcrypt verify) latency
+    train_preprocess    train_model.preprocess_data on a synthetic CSV
+    train_fit           train_model.train_model on the preprocessed data
+
+Results are written as JSON. With --compare, each metric is checked
+against a baseline file, and the run exits 1 if any metric got worse by
+more than --tolerance. Metric names say which way is better: *_ms and
+*_s are lower-is-better, *_rps and *_per_s are higher-is-better. p99s
+are reported but not compared; on one host they are too noisy to gate on.
+
+    python benchmarks/run.py --out baseline.json
+    python benchmarks/run.py --compare baseline.json --out current.json
+    python benchmarks/run.py --only predict_single,options --quick
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from synthetic import ListingGenerator
+
+BENCHMARKS = {}
+
+
+def benchmark(func):
+    BENCHMARKS[func.__name__.removeprefix("bench_")] = func
+    return func
+
+
+def percentile(values, q):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def latency_stats(seconds, prefix=""):
+    return {
+        f"{prefix}p50_ms": percentile(seconds, 50) * 1000,
+        f"{prefix}p99_ms": percentile(seconds, 99) * 1000,
+    }
+
+
+def timed_calls(fn, n):
+    samples = []
+    for i in range(n):
+        start = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+class Harness:
+    """The in-process app, a logged-in bench user and a request generator, created once per run"""
+
+    def __init__(self, args):
+        self.args = args
+        self.generator = ListingGenerator(seed=args.seed)
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+            os.chdir(BACKEND_DIR)
+            from fastapi.testclient import TestClient
+            import main as backend
+
+            self.backend = backend
+            self._client = TestClient(backend.app)
+            self._client.__enter__()
+            # The model loads in the background; don't time requests against a 503
+            deadline = time.monotonic() + 60
+            while self._client.get("/ready").status_code != 200:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"App not ready: {self._client.get('/ready').json()}")
+                time.sleep(0.01)
+            self._client.post("/register", json={"username": "bench", "email": "bench@example.com", "password": "bench"})
+            token = self._client.post("/token", data={"username": "bench", "password": "bench"}).json()["access_token"]
+            self.headers = {"Authorization": f"Bearer {token}"}
+        return self._client
+
+    def post(self, path, **kwargs):
+        response = self.client.post(path, headers=self.headers, **kwargs)
+        response.raise_for_status()
+        return response
+
+    def close(self):
+        if self._client is not None:
+            self._client.__exit__(None, None, None)
+
+
+@benchmark
+def bench_predict_single(h, args):
+    rows = h.generator.requests(args.requests)
+    h.post("/predict", json=rows[0])  # warm up
+    cold = timed_calls(lambda i: h.post("/predict", json=rows[i]), len(rows))
+    cached = timed_calls(lambda i: h.post("/predict", json=rows[0]), len(rows))
+    return {
+        **latency_stats(cold),
+        "throughput_rps": len(cold) / sum(cold),
+        **latency_stats(cached, "cached_"),
+    }
+
+
+@benchmark
+def bench_predict_concurrent(h, args):
+    rows = h.generator.requests(args.requests)
+    h.client  # start the app before timing
+    latencies = []
+
+    def one(i):
+        start = time.perf_counter()
+        h.post("/predict", json=rows[i])
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        list(pool.map(one, range(len(rows))))
+    elapsed = time.perf_counter() - start
+    return {"clients": args.clients, "throughput_rps": len(rows) / elapsed, **latency_stats(latencies)}
+
+
+@benchmark
+def bench_predict_batch(h, args):
+    rows = h.generator.requests(args.batch_size)
+    samples = timed_calls(lambda i: h.post("/predict/batch", json=rows), 3)
+    best = min(samples)
+    return {"batch_size": len(rows), "batch_ms": best * 1000, "rows_per_s": len(rows) / best}
+
+
+@benchmark
+def bench_predict_curve(h, args):
+    body = {
+        "base": h.generator.request(),
+        "size": {"start": 300, "stop": 5000, "step": 4700 / max(1, args.curve_sizes - 1)},
+        "beds": [1, 2, 3, 4, 5],
+        "baths": [1, 2, 3, 4],
+    }
+    samples = timed_calls(lambda i: h.post("/predict/curve", json=body), 3)
+    best = min(samples)
+    points = args.curve_sizes * 5 * 4
+    return {"points": points, "curve_ms": best * 1000, "points_per_s": points / best}
+
+
+@benchmark
+def bench_options(h, args):
+    client = h.client
+    full = timed_calls(lambda i: client.get("/options", headers={"Accept-Encoding": "gzip"}), args.requests)
+    etag = client.get("/options").headers["etag"]
+    revalidate = timed_calls(lambda i: client.get("/options", headers={"If-None-Match": etag}), args.requests)
+    return {**latency_stats(full), **latency_stats(revalidate, "not_modified_")}
+
+
+@benchmark
+def bench_history(h, args):
+    from bench_history import seed
+    from database import engine
+
+    client = h.client
+    owner_id = h.backend.find_user(h.backend.SessionLocal(), username="bench").id
+    start = time.perf_counter()
+    seed(engine, owner_id, args.history_rows)
+    seed_seconds = time.perf_counter() - start
+
+    first = timed_calls(lambda i: client.get("/history", headers=h.headers), 20)
+    cursor = client.get("/history", headers=h.headers).headers.get("x-next-cursor")
+    pages = []
+    while cursor and len(pages) < 50:
+        start = time.perf_counter()
+        response = client.get("/history", params={"cursor": cursor}, headers=h.headers)
+        pages.append(time.perf_counter() - start)
+        cursor = response.headers.get("x-next-cursor")
+    return {
+        "rows": args.history_rows,
+        "seed_seconds": seed_seconds,  # setup, not compared
+        **latency_stats(first, "first_page_"),
+        **(latency_stats(pages, "next_page_") if pages else {}),
+    }
+
+
+@benchmark
+def bench_token(h, args):
+    client = h.client
+    form = {"username": "bench", "password": "bench"}
+    samples = timed_calls(lambda i: client.post("/token", data=form).raise_for_status(), args.logins)
+    return {"logins": len(samples), "p50_ms": percentile(samples, 50) * 1000}
+
+
+def training_data(h, args):
+    if not hasattr(h, "training_frame"):
+        h.training_frame = ListingGenerator(args.seed, known_only=False, messy=0.05).dataframe(args.train_rows)
+    return h.training_frame
+
+
+@benchmark
+def bench_train_preprocess(h, args):
+    import train_model
+
+    df = training_data(h, args)
+    samples = []
+    for _ in range(3):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            h.training_set = train_model.preprocess_data(df)
+        samples.append(time.perf_counter() - start)
+    best = min(samples)
+    return {"rows": len(df), "preprocess_s": best, "rows_per_s": len(df) / best}
+
+
+@benchmark
+def bench_train_fit(h, args):
+    import train_model
+
+    if not hasattr(h, "training_set"):
+        with contextlib.redirect_stdout(io.StringIO()):
+            h.training_set = train_model.preprocess_data(training_data(h, args))
+    X, y, _, _ = h.training_set
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        train_model.train_model(X, y)
+    elapsed = time.perf_counter() - start
+    return {"rows": len(X), "fit_s": elapsed}
+
+
+def metric_direction(name):
+    """-1 if lower is better, +1 if higher is better, 0 if the metric is not compared"""
+    if "p99" in name:
+        return 0
+    if name.endswith(("_ms", "_s")):
+        return -1
+    if name.endswith(("_rps", "_per_s")):
+        return 1
+    return 0
+
+
+def compare(baseline, current, tolerance):
+    """Print a comparison table; returns the list of regressed metrics"""
+    regressions = []
+    print(f"\n{'metric':<44}{'baseline':>12}{'current':>12}{'change':>10}")
+    for bench, metrics in current.items():
+        for name, value in metrics.items():
+            direction = metric_direction(name)
+            before = baseline.get(bench, {}).get(name)
+            if not direction or before in (None, 0):
+                continue
+            change = (value - before) / before
+            regressed = change * direction < -tolerance
+            if regressed:
+                regressions.append(f"{bench}.{name}")
+            flag = "  REGRESSION" if regressed else ""
+            print(f"{bench + '.' + name:<44}{before:>12.3f}{value:>12.3f}{change:>+10.1%}{flag}")
+    return regressions
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=BACKEND_DIR
+        ).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "model_engine": os.environ.get("MODEL_ENGINE", "flat"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", help=f"comma-separated subset of: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--compare", help="baseline results JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative slowdown per metric")
+    parser.add_argument("--quick", action="store_true", help="smaller sizes, for a fast smoke run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--curve-sizes", type=int, default=200, help="size steps in the predict_curve sweep")
+    parser.add_argument("--history-rows", type=int, default=50000)
+    parser.add_argument("--logins", type=int, default=10)
+    parser.add_argument("--train-rows", type=int, default=20000)
+    args = parser.parse_args()
+    if args.quick:
+        args.requests, args.batch_size, args.history_rows, args.logins, args.train_rows = 50, 200, 5000, 3, 3000
+        args.curve_sizes = 20
+
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+
+    warnings.filterwarnings("ignore")
+    harness = Harness(args)
+    results = {}
+    try:
+        for name in names:
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()) if name.startswith("train") else contextlib.nullcontext():
+                results[name] = BENCHMARKS[name](harness, args)
+            print(f"{name:<20} {time.perf_counter() - start:6.1f}s  {json.dumps(results[name])}", flush=True)
+    finally:
+        harness.close()
+
+    report = {"environment": environment(), "results": results}
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline["results"], results, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
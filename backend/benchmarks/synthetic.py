@@ -0,0 +1,98 @@
+"""Synthetic listings for benchmarks, shaped like the training CSV.
+
+Cities and neighborhoods come from city_neighborhood_map.json, and
+property types from the served model's encoder classes. Benchmark
+requests therefore hit real encoder entries, and the training CSV has a
+realistic vocabulary. Prices follow a simple formula (per-city and
+per-type rates times size, plus noise), so models trained on the data
+have real signal to fit. Output is deterministic for a given seed.
+
+    python benchmarks/synthetic.py --rows 100000 --out /tmp/listings.csv
+"""
+import argparse
+import json
+import os
+import random
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+MAP_PATH = os.path.join(BACKEND_DIR, "city_neighborhood_map.json")
+BUNDLE_MANIFEST = os.path.join(BACKEND_DIR, "models", "bundle", "manifest.json")
+COLUMNS = ["url", "beds", "city", "date", "size", "type", "baths", "neighborhood", "price"]
+
+
+def load_vocabulary(known_only=True):
+    """(neighborhoods by city, property types); known_only drops values the model has never seen"""
+    with open(MAP_PATH) as f:
+        mapping = json.load(f)
+    with open(BUNDLE_MANIFEST) as f:
+        encoders = json.load(f)["encoders"]
+    if known_only:
+        cities, neighborhoods = set(encoders["city"]), set(encoders["neighborhood"])
+        mapping = {
+            city: [n for n in hoods if n in neighborhoods] or [encoders["neighborhood"][0]]
+            for city, hoods in mapping.items() if city in cities
+        }
+    return mapping, list(encoders["type"])
+
+
+class ListingGenerator:
+    def __init__(self, seed=0, known_only=True, messy=0.0):
+        self.rng = random.Random(seed)
+        self.mapping, self.types = load_vocabulary(known_only)
+        self.cities = sorted(self.mapping)
+        # Stable per-value rates so the price has learnable structure
+        rates = random.Random(seed + 1)
+        self.city_rate = {city: rates.uniform(3000, 15000) for city in self.cities}
+        self.type_factor = {t: rates.uniform(0.7, 1.5) for t in self.types}
+        self.messy = messy
+
+    def request(self):
+        """One /predict request body"""
+        rng = self.rng
+        city = rng.choice(self.cities)
+        low = rng.randint(300, 4000)
+        size = f"{low} sqft" if rng.random() < 0.75 else f"{low}-{low + rng.randint(50, 800)} sqft"
+        return {
+            "url": "", "date": "",
+            "beds": rng.randint(1, 5), "baths": rng.randint(1, 4),
+            "size": size, "city": city, "neighborhood": rng.choice(self.mapping[city]),
+            "type": rng.choice(self.types),
+        }
+
+    def requests(self, n):
+        return [self.request() for _ in range(n)]
+
+    def listing(self, i):
+        """One training CSV row; with messy > 0 some fields are blank, unparseable or out of range"""
+        rng = self.rng
+        row = self.request()
+        low, _, high = row["size"].replace(" sqft", "").partition("-")
+        area = (float(low) + float(high or low)) / 2
+        price = area * self.city_rate[row["city"]] * self.type_factor[row["type"]] * (0.8 + 0.1 * row["beds"])
+        row.update(
+            url=f"https://listings.example/{i}", date="2025-01-01",
+            price=round(price * rng.lognormvariate(0, 0.25)),
+        )
+        if self.messy and rng.random() < self.messy:
+            field = rng.choice(["beds", "baths", "size", "type", "neighborhood", "price"])
+            row[field] = {"size": rng.choice(["", "n/a"]), "price": rng.choice([0, 50000])}.get(field, "")
+        return [row[c] for c in COLUMNS]
+
+    def dataframe(self, n):
+        import pandas as pd
+
+        return pd.DataFrame([self.listing(i) for i in range(n)], columns=COLUMNS)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic listings CSV")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--messy", type=float, default=0.05, help="share of rows with one bad field")
+    args = parser.parse_args()
+    ListingGenerator(args.seed, known_only=False, messy=args.messy).dataframe(args.rows).to_csv(args.out, index=False)
+    print(f"Wrote {args.rows} listings to {args.out}")
@@ -0,0 +1,249 @@
+"""Score a whole listings file offline, without going through the HTTP API.
+
+Reads a CSV or Parquet file in the schema train_model.py reads, and
+writes the same rows with a ``predicted_price`` column added. The prices
+match /predict for the same model version.
+
+- The input is streamed in ``--chunksize`` row chunks. ``size`` is
+  parsed and the categoricals encoded column-wise, once per distinct
+  value rather than once per row.
+- Chunks are scored on a process pool. Each worker memory-maps the same
+  model bundle in its initializer, so all of them share one page-cache
+  copy of the forest, and a task carries only its chunk's feature
+  columns.
+- Output is written in input order as chunks finish, to a ``.partial``
+  file that replaces the destination at the end. At most two chunks per
+  worker are in flight, so memory stays bounded whatever the file size.
+
+Rows the API would reject get an empty price and are counted as
+unscored: non-numeric beds/baths, and unseen categories when
+``--unknown error``.
+
+    python bulk_score.py listings.csv scored.csv
+    python bulk_score.py dump.parquet scored.parquet --workers 8 --chunksize 200000
+
+Parquet needs pyarrow, which the API itself does not.
+"""
+import argparse
+import os
+import resource
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from artifacts import load_bundle
+from encoders import UNKNOWN_CATEGORY_POLICIES, UNKNOWN_CATEGORY_POLICY, compile_classes
+from registry import current_version, version_dir
+from size_parser import parse_size_column
+
+PRICE_COLUMN = "predicted_price"
+CHUNKS_IN_FLIGHT_PER_WORKER = 2
+
+# Per-process model state, set once by init_worker
+_forest = None
+_tables = None
+_feature_names = None
+_unknown_policy = None
+
+
+def init_worker(bundle_dir, unknown_policy):
+    global _forest, _tables, _feature_names, _unknown_policy
+    _forest, encoder_classes, metadata = load_bundle(bundle_dir)
+    _tables = compile_classes(encoder_classes, unknown_policy)
+    _feature_names = metadata["feature_names"]
+    _unknown_policy = unknown_policy
+
+
+def feature_matrix(frame):
+    """(model input for a chunk, mask of rows that can't be scored)"""
+    X = np.empty((len(frame), len(_feature_names)))
+    rejected = np.zeros(len(frame), dtype=bool)
+    for j, name in enumerate(_feature_names):
+        column = frame[name]
+        if name in _tables:
+            codes = _tables[name].encode_column(column)
+            unseen = codes < 0
+            if _unknown_policy == "error":
+                rejected |= unseen
+            X[:, j] = np.where(unseen, 0, codes)
+        elif name == "size":
+            X[:, j] = parse_size_column(column).to_numpy()
+        else:
+            values = pd.to_numeric(column, errors="coerce").to_numpy(dtype=np.float64)
+            rejected |= np.isnan(values)
+            X[:, j] = values
+    return X, rejected
+
+
+def score_chunk(frame):
+    """Prices for one chunk, NaN for rows that can't be scored"""
+    X, rejected = feature_matrix(frame)
+    prices = np.full(len(frame), np.nan)
+    if not rejected.all():
+        prices[~rejected] = _forest.predict(X[~rejected])
+    return prices
+
+
+def is_parquet(path):
+    return path.lower().endswith((".parquet", ".pq"))
+
+
+def require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise SystemExit("Reading or writing Parquet needs pyarrow: pip install pyarrow")
+    return pyarrow, pyarrow.parquet
+
+
+def input_columns(path):
+    if is_parquet(path):
+        _, pq = require_pyarrow()
+        return pq.ParquetFile(path).schema_arrow.names
+    return pd.read_csv(path, nrows=0).columns.tolist()
+
+
+def read_chunks(path, chunksize, text_columns):
+    if is_parquet(path):
+        _, pq = require_pyarrow()
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        # Read categoricals and size as text, so e.g. a numeric-looking neighborhood isn't turned into a float
+        yield from pd.read_csv(path, chunksize=chunksize, dtype={c: str for c in text_columns})
+
+
+class ChunkWriter:
+    """Appends scored chunks to ``<path>.partial`` and moves it into place on close"""
+
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = path + ".partial"
+        self.parquet = is_parquet(path)
+        self._writer = None
+        self._started = False
+
+    def write(self, frame):
+        if self.parquet:
+            pa, pq = require_pyarrow()
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.tmp_path, table.schema)
+            # A chunk whose column is all-null infers a different type; keep the first chunk's schema
+            self._writer.write_table(table.cast(self._writer.schema))
+        else:
+            frame.to_csv(self.tmp_path, mode="a" if self._started else "w", header=not self._started, index=False)
+        self._started = True
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if not self._started:
+            raise ValueError("Input file has no rows")
+        os.replace(self.tmp_path, self.path)
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process and of its largest worker"""
+    # ru_maxrss is in kilobytes on Linux
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    workers = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return own, workers
+
+
+def score_file(input_path, output_path, bundle_dir, workers=None, chunksize=100000, unknown_policy=None):
+    """Score input_path into output_path; returns a summary dict"""
+    if os.path.abspath(input_path) == os.path.abspath(output_path):
+        raise ValueError("Output must not overwrite the input file")
+    unknown_policy = unknown_policy or UNKNOWN_CATEGORY_POLICY
+    workers = workers or os.cpu_count() or 1
+
+    # The parent only needs the schema; workers load (and share) the arrays
+    _, encoder_classes, metadata = load_bundle(bundle_dir)
+    feature_names = metadata["feature_names"]
+    missing = [c for c in feature_names if c not in input_columns(input_path)]
+    if missing:
+        raise ValueError(f"Input is missing model features: {', '.join(missing)}")
+    text_columns = [c for c in feature_names if c in encoder_classes or c == "size"]
+
+    pool = None
+    if workers > 1:
+        pool = ProcessPoolExecutor(workers, initializer=init_worker, initargs=(bundle_dir, unknown_policy))
+    else:
+        init_worker(bundle_dir, unknown_policy)
+
+    writer = ChunkWriter(output_path)
+    rows = scored = 0
+    pending = deque()
+    start = time.perf_counter()
+
+    def write_oldest():
+        nonlocal rows, scored
+        chunk, result = pending.popleft()
+        prices = result.result() if pool else result
+        chunk[PRICE_COLUMN] = prices
+        writer.write(chunk)
+        rows += len(chunk)
+        scored += int(np.count_nonzero(~np.isnan(prices)))
+        elapsed = time.perf_counter() - start
+        print(f"{rows:>12,} rows  {rows / elapsed:>10,.0f} rows/s", flush=True)
+
+    try:
+        for chunk in read_chunks(input_path, chunksize, text_columns):
+            features = chunk[feature_names]
+            pending.append((chunk, pool.submit(score_chunk, features) if pool else score_chunk(features)))
+            if len(pending) >= CHUNKS_IN_FLIGHT_PER_WORKER * workers:
+                write_oldest()
+        while pending:
+            write_oldest()
+        writer.close()
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+        if os.path.exists(writer.tmp_path):
+            os.remove(writer.tmp_path)
+
+    elapsed = time.perf_counter() - start
+    own_mb, worker_mb = peak_rss_mb()
+    return {
+        "rows": rows,
+        "scored": scored,
+        "unscored": rows - scored,
+        "seconds": elapsed,
+        "rows_per_s": rows / elapsed if elapsed else 0.0,
+        "workers": workers,
+        "peak_rss_mb": own_mb,
+        "peak_worker_rss_mb": worker_mb,
+    }
+
+
+if __name__ == "__main__":
+    models_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+    parser = argparse.ArgumentParser(description="Score a listings CSV/Parquet file with the served model")
+    parser.add_argument("input", help="listings .csv or .parquet, in the training schema")
+    parser.add_argument("output", help="scored .csv or .parquet (format follows the extension)")
+    parser.add_argument("--registry", default=os.environ.get("MODEL_REGISTRY_DIR", os.path.join(models_dir, "registry")))
+    parser.add_argument("--model", help="bundle to score with (default: the registry's current version, else models/bundle)")
+    parser.add_argument("--workers", type=int, help="scoring processes (default: one per CPU; 1 scores in-process)")
+    parser.add_argument("--chunksize", type=int, default=100000)
+    parser.add_argument(
+        "--unknown", choices=UNKNOWN_CATEGORY_POLICIES, default=UNKNOWN_CATEGORY_POLICY,
+        help="unseen categories: 'zero' scores them as code 0 like the API, 'error' leaves the price empty",
+    )
+    args = parser.parse_args()
+
+    bundle_dir = args.model
+    if bundle_dir is None:
+        version = current_version(args.registry)
+        bundle_dir = version_dir(args.registry, version) if version else os.path.join(models_dir, "bundle")
+    print(f"Scoring {args.input} with {bundle_dir}")
+    summary = score_file(args.input, args.output, bundle_dir, args.workers, args.chunksize, args.unknown)
+    print(
+        f"\nWrote {args.output}: {summary['rows']:,} rows ({summary['unscored']:,} unscored) in "
+        f"{summary['seconds']:.1f}s, {summary['rows_per_s']:,.0f} rows/s on {summary['workers']} worker(s)"
+    )
+    print(f"Peak memory: {summary['peak_rss_mb']:.0f} MB parent, {summary['peak_worker_rss_mb']:.0f} MB largest worker")
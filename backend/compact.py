@@ -0,0 +1,255 @@
+"""Shrink a trained forest for serving, with a measured accuracy cost.
+
+Runs on a published bundle after train_model.save_artifacts, in four steps:
+
+1. Tree selection - greedy forward selection on half of the holdout set.
+   Trees are added one at a time, each time the one that most lowers the
+   ensemble MAE, and the smallest ensemble within ``--tolerance`` of the
+   full forest's MAE is kept.
+2. Depth cap - the shallowest depth within tolerance. Nodes at the cap
+   become leaves that predict their stored node mean.
+3. Threshold quantization - inputs reach the trees as float32, so each
+   threshold is rounded *down* to float32, which leaves every split
+   decision unchanged. Label-encoded (categorical) features only ever
+   see integer codes, so they are compared against floor(threshold),
+   which is likewise exact.
+4. Value quantization - leaf values become float32, or int16 with an
+   affine scale/offset (``--value-dtype int16``). Node indices shrink to
+   int32, and feature ids to the smallest integer type that fits.
+
+The compact forest is written as a new registry version, so it loads
+through the normal serving path. The error delta against the original
+forest is reported on the other half of the holdout set, which takes
+no part in the choices above.
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import mean_absolute_error
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import LabelEncoder
+
+from artifacts import bundle_map_path, load_bundle
+from forest import FlatForest
+from registry import current_version, publish, version_dir
+
+INT16_LEVELS = np.iinfo(np.int16).max - np.iinfo(np.int16).min
+
+
+def tree_predictions(forest, X):
+    """Per-tree predictions, shape (n_trees, n_rows)"""
+    leaves = forest.apply(X)
+    prices = forest.value.take(leaves).astype(np.float64)
+    if forest.value_scale is not None:
+        prices = prices * forest.value_scale + forest.value_offset
+    return prices.T
+
+
+def select_trees(per_tree, y, tolerance):
+    """Greedy forward selection; returns tree indices in the order they were added"""
+    target = mean_absolute_error(y, per_tree.mean(axis=0)) * (1 + tolerance)
+    chosen = []
+    remaining = list(range(len(per_tree)))
+    total = np.zeros(per_tree.shape[1])
+    while remaining:
+        k = len(chosen) + 1
+        errors = np.abs((total + per_tree[remaining]) / k - y).mean(axis=1)
+        best = int(np.argmin(errors))
+        tree = remaining.pop(best)
+        chosen.append(tree)
+        total += per_tree[tree]
+        if errors[best] <= target:
+            break
+    return chosen
+
+
+def rebuild(forest, trees, max_depth=None):
+    """Copy the given trees into fresh arrays, cutting them off at max_depth.
+
+    Nodes are laid out breadth-first across all trees, so the i-th tree's
+    root is node i, and each level's nodes are contiguous.
+    """
+    if max_depth is None:
+        max_depth = forest.max_depth
+    old_left, old_right = forest.left, forest.right
+    frontier = forest.roots[np.asarray(trees)]
+    levels = []
+    depth = 0
+    while len(frontier):
+        is_split = (old_left[frontier] != frontier) & (depth < max_depth)
+        levels.append((frontier, is_split))
+        split_nodes = frontier[is_split]
+        # Children of this level's k-th split are the next level's nodes 2k (right) and 2k+1 (left)
+        frontier = np.column_stack([old_right[split_nodes], old_left[split_nodes]]).ravel()
+        depth += 1
+
+    old_ids = np.concatenate([nodes for nodes, _ in levels])
+    is_split = np.concatenate([split for _, split in levels])
+    new_ids = np.arange(len(old_ids))
+    children = np.column_stack([new_ids, new_ids])
+    base = 0
+    for nodes, split in levels:
+        next_base = base + len(nodes)
+        split_ids = base + np.flatnonzero(split)
+        children[split_ids, 0] = next_base + 2 * np.arange(len(split_ids))
+        children[split_ids, 1] = next_base + 2 * np.arange(len(split_ids)) + 1
+        base = next_base
+
+    return FlatForest(
+        np.where(is_split, forest.feature[old_ids], 0),
+        np.where(is_split, forest.threshold[old_ids], np.inf),
+        children,
+        forest.value[old_ids],
+        np.arange(len(trees)),
+        len(levels) - 1,
+        forest.value_scale,
+        forest.value_offset,
+        None if forest.missing_left is None else forest.missing_left[old_ids] & is_split,
+    )
+
+
+def cap_depth(forest, X, y, tolerance, reference_mae):
+    """Shallowest depth cap whose MAE stays within tolerance of reference_mae"""
+    trees = range(forest.n_trees)
+    for depth in range(1, forest.max_depth):
+        capped = rebuild(forest, trees, depth)
+        if mean_absolute_error(y, capped.predict(X)) <= reference_mae * (1 + tolerance):
+            return capped
+    return forest
+
+
+def float32_floor(values):
+    """Largest float32 <= each value, so x <= t and x <= float32_floor(t) agree for float32 x"""
+    rounded = values.astype(np.float32)
+    too_high = rounded.astype(np.float64) > values
+    rounded[too_high] = np.nextafter(rounded[too_high], np.float32(-np.inf))
+    return rounded
+
+
+def quantize(forest, categorical_features, value_dtype="float32"):
+    threshold = forest.threshold.astype(np.float64)
+    on_codes = np.isin(forest.feature, categorical_features) & np.isfinite(threshold)
+    threshold[on_codes] = np.floor(threshold[on_codes])
+    threshold = float32_floor(threshold)
+
+    value_scale = value_offset = None
+    if value_dtype == "int16":
+        value = forest.value.astype(np.float64)
+        low, high = value.min(), value.max()
+        value_scale = max((high - low) / INT16_LEVELS, np.finfo(np.float64).tiny)
+        value_offset = low - np.iinfo(np.int16).min * value_scale
+        value = np.round((value - value_offset) / value_scale).astype(np.int16)
+    else:
+        value = forest.value.astype(np.float32)
+
+    return FlatForest(
+        forest.feature.astype(np.min_scalar_type(forest.feature.max())),
+        threshold,
+        forest.children.astype(np.int32),
+        value,
+        forest.roots.astype(np.int32),
+        forest.max_depth,
+        value_scale,
+        value_offset,
+        forest.missing_left,
+    )
+
+
+def latency_ms(forest, X, repeats=200):
+    times = []
+    for i in range(repeats):
+        row = X[i % len(X)][None, :]
+        start = time.perf_counter()
+        forest.predict(row)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times) * 1e3)
+
+
+def load_holdout(data_path, encoder_classes):
+    """The train_model test split, encoded exactly as training encoded it"""
+    from train_model import preprocess_data
+
+    X, y, label_encoders, _ = preprocess_data(pd.read_csv(data_path))
+    for name, classes in encoder_classes.items():
+        if list(label_encoders[name].classes_) != list(classes):
+            raise ValueError(f"--data does not match the model's '{name}' encoder; pass the training CSV")
+    _, X_test, _, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    X_test = X_test.to_numpy(dtype=np.float32)
+    y_test = y_test.to_numpy(dtype=np.float64)
+    return X_test, y_test
+
+
+def compact(forest, X_select, y_select, categorical_features, tolerance=0.01, value_dtype="float32", max_depth=None):
+    reference_mae = mean_absolute_error(y_select, forest.predict(X_select))
+    trees = select_trees(tree_predictions(forest, X_select), y_select, tolerance)
+    print(f"Tree selection: kept {len(trees)} of {forest.n_trees} trees")
+    selected = rebuild(forest, trees)
+    if max_depth is not None:
+        capped = rebuild(selected, range(selected.n_trees), max_depth)
+    else:
+        capped = cap_depth(selected, X_select, y_select, tolerance, reference_mae)
+    print(f"Depth cap: {selected.max_depth} -> {capped.max_depth}")
+    return quantize(capped, categorical_features, value_dtype)
+
+
+def report(original, compacted, X_eval, y_eval):
+    base = original.predict(X_eval)
+    new = compacted.predict(X_eval)
+    base_mae = mean_absolute_error(y_eval, base)
+    new_mae = mean_absolute_error(y_eval, new)
+    print(f"\n{'':<22}{'original':>14}{'compact':>14}")
+    print(f"{'trees':<22}{original.n_trees:>14}{compacted.n_trees:>14}")
+    print(f"{'nodes':<22}{original.n_nodes:>14,}{compacted.n_nodes:>14,}")
+    print(f"{'max depth':<22}{original.max_depth:>14}{compacted.max_depth:>14}")
+    print(f"{'memory (KB)':<22}{original.nbytes / 1024:>14,.0f}{compacted.nbytes / 1024:>14,.0f}")
+    print(f"{'1-row latency (ms)':<22}{latency_ms(original, X_eval):>14.3f}{latency_ms(compacted, X_eval):>14.3f}")
+    print(f"{'holdout MAE':<22}{base_mae:>14,.0f}{new_mae:>14,.0f}")
+    print(f"MAE delta on holdout: {new_mae - base_mae:+,.0f} ({(new_mae / base_mae - 1) * 100:+.2f}%)")
+    print(f"Max change in any single prediction: {np.max(np.abs(new - base) / np.maximum(np.abs(base), 1.0)) * 100:.2f}%")
+
+
+if __name__ == "__main__":
+    models_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+    parser = argparse.ArgumentParser(description="Compact a trained forest for serving")
+    parser.add_argument("--data", required=True, help="the listings CSV the model was trained on")
+    parser.add_argument("--registry", default=os.environ.get("MODEL_REGISTRY_DIR", os.path.join(models_dir, "registry")))
+    parser.add_argument("--source", help="bundle to compact (default: the registry's current version, else models/bundle)")
+    parser.add_argument("--tolerance", type=float, default=0.01, help="allowed relative MAE increase per step")
+    parser.add_argument("--max-depth", type=int, help="fixed depth cap instead of searching for one")
+    parser.add_argument("--value-dtype", choices=["float32", "int16"], default="float32")
+    parser.add_argument("--activate", action="store_true", help="make the compact version current")
+    args = parser.parse_args()
+
+    source = args.source
+    if source is None:
+        version = current_version(args.registry)
+        source = version_dir(args.registry, version) if version else os.path.join(models_dir, "bundle")
+    print(f"Compacting {source}")
+    forest, encoder_classes, metadata = load_bundle(source, mmap=False)
+
+    X_holdout, y_holdout = load_holdout(args.data, encoder_classes)
+    categorical_features = [j for j, name in enumerate(metadata["feature_names"]) if name in encoder_classes]
+    # Even rows choose trees and depth; odd rows only measure the result
+    X_select, y_select = X_holdout[0::2], y_holdout[0::2]
+    X_eval, y_eval = X_holdout[1::2], y_holdout[1::2]
+
+    compacted = compact(
+        forest, X_select, y_select, categorical_features, args.tolerance, args.value_dtype, args.max_depth
+    )
+    report(forest, compacted, X_eval, y_eval)
+
+    label_encoders = {}
+    for name, classes in encoder_classes.items():
+        label_encoders[name] = LabelEncoder()
+        label_encoders[name].classes_ = np.array(classes, dtype=object)
+    map_path = bundle_map_path(source)
+    mapping = None
+    if map_path:
+        with open(map_path) as f:
+            mapping = json.load(f)
+    version = publish(args.registry, compacted, label_encoders, metadata, mapping, activate=args.activate)
+    print(f"\nPublished compact model as version {version}" + (" (now current)" if args.activate else ""))
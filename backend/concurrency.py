@@ -0,0 +1,47 @@
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from starlette.concurrency import run_in_threadpool
+
+# CPU-bound work runs on small bounded pools instead of the event loop.
+# Password hashing and inference get separate pools so a burst of logins
+# (each bcrypt call is ~250 ms of CPU) queues behind other logins rather
+# than in front of predictions. bcrypt and NumPy release the GIL, so
+# threads are enough; a process pool would only add pickling of inputs
+# and results. Blocking I/O (SQLAlchemy sessions, the Google token check)
+# goes to Starlette's shared I/O threadpool through run_io.
+CPU_COUNT = os.cpu_count() or 1
+POOL_SIZES = {
+    "hash": int(os.environ.get("HASH_WORKERS", max(1, CPU_COUNT // 2))),
+    "inference": int(os.environ.get("INFERENCE_WORKERS", CPU_COUNT)),
+}
+
+_executors = {}
+
+
+def cpu_executor(pool: str):
+    if pool not in _executors:
+        _executors[pool] = ThreadPoolExecutor(max_workers=POOL_SIZES[pool], thread_name_prefix=pool)
+    return _executors[pool]
+
+
+async def run_cpu(pool: str, func, *args, **kwargs):
+    """Run a CPU-bound callable on the named bounded pool ("hash" or "inference")"""
+    loop = asyncio.get_running_loop()
+    # Carry the request's context (metrics trace) into the worker, as run_in_threadpool does
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(cpu_executor(pool), functools.partial(context.run, func, *args, **kwargs))
+
+
+async def run_io(func, *args, **kwargs):
+    """Run a blocking I/O callable (DB query, outbound HTTP) off the event loop"""
+    return await run_in_threadpool(func, *args, **kwargs)
+
+
+def shutdown():
+    for executor in _executors.values():
+        executor.shutdown(wait=True)
+    _executors.clear()
@@ -1,6 +1,7 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, ForeignKey, DateTime
+from sqlalchemy import create_engine, event, Column, Integer, String, Float, ForeignKey, Date, DateTime, Index, Text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.pool import QueuePool
 from datetime import datetime
 
 import os
@@ -13,13 +14,66 @@ if SQLALCHEMY_DATABASE_URL.startswith("postgres://"):
 elif SQLALCHEMY_DATABASE_URL.startswith("postgresql://"):
     SQLALCHEMY_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("postgresql://", "postgresql+psycopg2://", 1)
 
-# If using PostgreSQL (common for deployment), remove check_same_thread
-if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(
-        SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-    )
-else:
-    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# --- ENGINE CONFIGURATION ---
+def env_flag(name: str, default: bool) -> bool:
+    return os.environ.get(name, str(default)).lower() in ("1", "true", "yes", "on")
+
+# Connection pool (file-backed SQLite and PostgreSQL)
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = env_flag("DB_POOL_PRE_PING", True)
+
+# SQLite pragmas applied to every new connection. WAL lets readers run
+# alongside the single writer; synchronous=NORMAL is durable in WAL mode
+# except for the last commits on power loss; busy_timeout makes writers wait
+# for the lock instead of failing with "database is locked".
+SQLITE_JOURNAL_MODE = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
+
+def is_sqlite_memory(url: str) -> bool:
+    return url in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in url
+
+def engine_options(url: str) -> dict:
+    if url.startswith("sqlite"):
+        options = {"connect_args": {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}}
+        if is_sqlite_memory(url):
+            # In-memory databases live in a single connection; pool settings don't apply
+            return options
+    else:
+        options = {"pool_pre_ping": DB_POOL_PRE_PING, "pool_recycle": DB_POOL_RECYCLE}
+    options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    return options
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+def create_configured_engine(url: str):
+    engine = create_engine(url, **engine_options(url))
+    if url.startswith("sqlite"):
+        event.listen(engine, "connect", apply_sqlite_pragmas)
+    return engine
+
+engine = create_configured_engine(SQLALCHEMY_DATABASE_URL)
+
+def pool_stats() -> dict:
+    """Current connection pool usage, for logs and /metrics"""
+    pool = engine.pool
+    stats = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+        )
+    return stats
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -51,5 +105,34 @@ class Prediction(Base):
 
     owner = relationship("User", back_populates="predictions")
 
+    # Serves /history: one user's rows, newest first, paged by (timestamp, id)
+    __table_args__ = (
+        Index("ix_predictions_owner_timestamp_id", "owner_id", "timestamp", "id"),
+    )
+
+class PredictionRollup(Base):
+    """Per (city, neighborhood, type, UTC day) aggregates of predicted prices, kept current by rollups.py"""
+    __tablename__ = "prediction_rollups"
+
+    city = Column(String, primary_key=True)
+    neighborhood = Column(String, primary_key=True)
+    property_type = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    count = Column(Integer, nullable=False)
+    total = Column(Float, nullable=False)
+    min_price = Column(Float, nullable=False)
+    max_price = Column(Float, nullable=False)
+    # QuantileSketch buckets as JSON
+    sketch = Column(Text, nullable=False)
+
+    # Serves /analytics queries, which always select a day range
+    __table_args__ = (
+        Index("ix_prediction_rollups_day", "day"),
+    )
+
 def init_db():
     Base.metadata.create_all(bind=engine)
+    # create_all skips indexes on tables that already exist
+    for table in (Prediction.__table__, PredictionRollup.__table__):
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
@@ -0,0 +1,71 @@
+import os
+import sys
+
+# How to encode a category the encoder never saw during training:
+#   "zero"  - map it to code 0 (what the original LabelEncoder fallback did)
+#   "error" - reject the request
+UNKNOWN_CATEGORY_POLICIES = ("zero", "error")
+UNKNOWN_CATEGORY_POLICY = os.environ.get("UNKNOWN_CATEGORY_POLICY", "zero")
+
+
+class UnknownCategoryError(ValueError):
+    pass
+
+
+class CategoryTable:
+    """Plain dict lookup compiled from a fitted LabelEncoder"""
+    __slots__ = ("name", "classes", "codes", "unknown_policy")
+
+    def __init__(self, name, classes, unknown_policy="zero"):
+        if unknown_policy not in UNKNOWN_CATEGORY_POLICIES:
+            raise ValueError(f"Unknown category policy must be one of {UNKNOWN_CATEGORY_POLICIES}, got '{unknown_policy}'")
+        self.name = name
+        self.classes = [str(c) for c in classes]
+        self.codes = {sys.intern(c): code for code, c in enumerate(self.classes)}
+        self.unknown_policy = unknown_policy
+
+    def unknown(self, value):
+        if self.unknown_policy == "error":
+            raise UnknownCategoryError(f"Unknown {self.name}: '{value}'")
+        return 0
+
+    def encode(self, value) -> int:
+        code = self.codes.get(str(value))
+        if code is None:
+            return self.unknown(value)
+        return code
+
+    def encode_many(self, values):
+        # Imported on first use (a dict lookup after that) so importing the API doesn't load NumPy
+        import numpy as np
+
+        codes = self.codes
+        return np.fromiter(
+            (codes[v] if v in codes else self.unknown(v) for v in map(str, values)),
+            dtype=np.int64,
+        )
+
+    def encode_column(self, values):
+        """Codes for a whole pandas column, -1 where the value is unseen; the caller applies the policy.
+
+        Each distinct value is looked up once (as str, like encode), then the
+        codes are gathered back, so millions of rows cost a few hundred lookups.
+        """
+        import numpy as np
+        import pandas as pd
+
+        codes, uniques = pd.factorize(values)
+        # Missing values get code -1, which picks the trailing entry: str(nan) is "nan"
+        lookup = np.array([self.codes.get(str(v), -1) for v in uniques] + [self.codes.get("nan", -1)], dtype=np.int64)
+        return lookup[codes]
+
+
+def compile_classes(classes_by_feature, unknown_policy=None):
+    """Build CategoryTables from ordered class lists, keyed by feature name"""
+    policy = unknown_policy or UNKNOWN_CATEGORY_POLICY
+    return {name: CategoryTable(name, classes, policy) for name, classes in classes_by_feature.items()}
+
+
+def compile_encoders(label_encoders, unknown_policy=None):
+    """Turn the pickled LabelEncoders into CategoryTables, keyed by feature name"""
+    return compile_classes({name: encoder.classes_ for name, encoder in label_encoders.items()}, unknown_policy)
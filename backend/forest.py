@@ -0,0 +1,136 @@
+import numpy as np
+
+TREE_LEAF = -1
+APPLY_CHUNK_ROWS = 256
+
+
+class FlatForest:
+    """A RandomForestRegressor flattened into contiguous node arrays.
+
+    All trees share one set of arrays; ``roots`` holds the index of each
+    tree's root node. ``children`` stores (right, left) pairs so the next
+    node is ``children[node, went_left]``. Leaves point back at themselves
+    so a batch can be walked level by level without branching on
+    leaf/non-leaf.
+
+    ``value`` may be stored quantized (e.g. int16, see compact.py); a leaf's
+    price is then ``value * value_scale + value_offset``.
+
+    ``missing_left`` (sklearn's ``missing_go_to_left``) says which way a
+    NaN feature value goes at each node; ``x <= threshold`` alone would
+    send it right everywhere. Forests exported without it send NaN right.
+    """
+
+    def __init__(self, feature, threshold, children, value, roots, max_depth, value_scale=None, value_offset=None,
+                 missing_left=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.value_scale = value_scale
+        self.value_offset = value_offset
+        self.missing_left = missing_left
+
+    @property
+    def left(self):
+        return self.children[:, 1]
+
+    @property
+    def right(self):
+        return self.children[:, 0]
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in self.arrays().values())
+
+    def arrays(self):
+        arrays = {
+            "feature": self.feature,
+            "threshold": self.threshold,
+            "children": self.children,
+            "value": self.value,
+            "roots": self.roots,
+        }
+        if self.missing_left is not None:
+            arrays["missing_left"] = self.missing_left
+        return arrays
+
+    def apply(self, X):
+        """Return the leaf index reached in every tree, shape (n_rows, n_trees)"""
+        # sklearn compares float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        n_rows, n_features = X.shape
+        children = self.children.ravel()
+        leaves = np.empty((n_rows, self.n_trees), dtype=np.intp)
+        # Walk rows in chunks so the per-level index arrays stay cache-sized
+        for start in range(0, n_rows, APPLY_CHUNK_ROWS):
+            chunk = X[start:start + APPLY_CHUNK_ROWS]
+            flat_x = chunk.ravel()
+            row_base = np.repeat(np.arange(len(chunk)) * n_features, self.n_trees)
+            nodes = np.tile(self.roots, len(chunk))
+            # Rows without NaN (nearly all of them) skip the missing-value lookup
+            missing_left = self.missing_left if self.missing_left is not None and np.isnan(chunk).any() else None
+            for _ in range(self.max_depth):
+                x = flat_x.take(row_base + self.feature.take(nodes))
+                went_left = x <= self.threshold.take(nodes)
+                if missing_left is not None:
+                    went_left |= np.isnan(x) & missing_left.take(nodes)
+                nodes = children.take(2 * nodes + went_left)
+            leaves[start:start + len(chunk)] = nodes.reshape(len(chunk), self.n_trees)
+        return leaves
+
+    def predict(self, X):
+        prices = self.value.take(self.apply(X)).mean(axis=1, dtype=np.float64)
+        if self.value_scale is not None:
+            # The mean is affine, so dequantizing after averaging is exact
+            prices = prices * self.value_scale + self.value_offset
+        return prices
+
+
+def export_forest(model):
+    """Flatten a fitted sklearn RandomForestRegressor into a FlatForest"""
+    features, thresholds, children, values, roots, missing_left = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        if tree.n_outputs != 1:
+            raise ValueError("Only single-output forests can be flattened")
+        ids = np.arange(tree.node_count) + offset
+        is_leaf = tree.children_left == TREE_LEAF
+        features.append(np.where(is_leaf, 0, tree.feature))
+        thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+        children.append(np.column_stack([
+            np.where(is_leaf, ids, tree.children_right + offset),
+            np.where(is_leaf, ids, tree.children_left + offset),
+        ]))
+        values.append(tree.value[:, 0, 0])
+        # Older sklearn versions have no missing-value support, and send NaN right
+        missing = getattr(tree, "missing_go_to_left", np.zeros(tree.node_count, dtype=np.uint8))
+        missing_left.append(np.where(is_leaf, False, missing.astype(bool)))
+        roots.append(offset)
+        offset += tree.node_count
+        max_depth = max(max_depth, tree.max_depth)
+    # Node indices are stored as intp so traversal never has to convert them
+    return FlatForest(
+        np.concatenate(features).astype(np.intp),
+        np.concatenate(thresholds).astype(np.float64),
+        np.ascontiguousarray(np.concatenate(children), dtype=np.intp),
+        np.concatenate(values).astype(np.float64),
+        np.array(roots, dtype=np.intp),
+        max_depth,
+        missing_left=np.concatenate(missing_left),
+    )
+
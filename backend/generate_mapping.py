@@ -1,22 +1,21 @@
-import pandas as pd
-import json
+import argparse
 import os
 
+from pipeline import MAP_PATH, build_pipeline, write_json
+
 csv_path = r'C:\Users\priya\.cache\kagglehub\datasets\shubhammkumaar\real-estate-listings-and-prices-in-india-2025\versions\1\real_estate_dataset.csv'
 
-if os.path.exists(csv_path):
-    df = pd.read_csv(csv_path)
-    # Clean data: strip spaces and remove NaNs
-    df['city'] = df['city'].astype(str).str.strip()
-    df['neighborhood'] = df['neighborhood'].astype(str).str.strip()
-    
-    mapping = {}
-    for city, group in df.groupby('city'):
-        mapping[city] = sorted([str(x) for x in group['neighborhood'].unique() if str(x).lower() != 'nan'])
-    
-    output_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'city_neighborhood_map.json')
-    with open(output_path, 'w') as f:
-        json.dump(mapping, f)
-    print(f"Mapping saved to {output_path}")
-else:
-    print("CSV not found.")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write city_neighborhood_map.json from the listings CSV")
+    parser.add_argument("--data", default=csv_path, help="listings CSV")
+    parser.add_argument("--cache-dir", default=os.path.join("backend", "training_store", "cache"),
+                        help="stage cache shared with train_model.py")
+    args = parser.parse_args()
+
+    if os.path.exists(args.data):
+        # Only the load and mapping stages run, and load is shared with (and often cached by) training
+        mapping = build_pipeline(args.data, args.cache_dir).get("mapping")
+        write_json(MAP_PATH, mapping)
+        print(f"Mapping saved to {MAP_PATH}")
+    else:
+        print("CSV not found.")
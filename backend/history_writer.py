@@ -0,0 +1,415 @@
+import fcntl
+import json
+import os
+import queue
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from database import SessionLocal, Prediction
+from metrics import HISTORY_FLUSH_SECONDS
+from rollups import apply_rollups
+
+HISTORY_FLUSH_ROWS = int(os.environ.get("HISTORY_FLUSH_ROWS", 500))
+HISTORY_FLUSH_INTERVAL = float(os.environ.get("HISTORY_FLUSH_INTERVAL", 0.5))
+HISTORY_MAX_QUEUED_ROWS = int(os.environ.get("HISTORY_MAX_QUEUED_ROWS", 20000))
+HISTORY_WRITE_RETRIES = 3
+# Seconds before rows left in the spool (failed or unsaved) are retried; doubles while they keep failing
+HISTORY_SPOOL_RETRY_INTERVAL = float(os.environ.get("HISTORY_SPOOL_RETRY_INTERVAL", 5))
+HISTORY_SPOOL_RETRY_MAX_INTERVAL = 300
+# Local directory where queued rows are journaled until committed, and failed rows are kept
+HISTORY_SPOOL_DIR = os.environ.get(
+    "HISTORY_SPOOL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "history_spool")
+)
+# Rows per journal segment; a segment file is deleted once all of its rows are committed
+HISTORY_SPOOL_SEGMENT_ROWS = int(os.environ.get("HISTORY_SPOOL_SEGMENT_ROWS", 10000))
+
+_FLUSH = object()
+_STOP = object()
+
+
+def encode_row(row):
+    return json.dumps({**row, "timestamp": row["timestamp"].isoformat()} if row.get("timestamp") else row)
+
+
+def decode_row(line):
+    row = json.loads(line)
+    if row.get("timestamp"):
+        row["timestamp"] = datetime.fromisoformat(row["timestamp"])
+    return row
+
+
+def write_spool_file(path, rows):
+    """Write rows to path atomically and durably"""
+    with open(path + ".tmp", "w") as f:
+        f.write("".join(encode_row(row) + "\n" for row in rows))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+
+class _Segment:
+    """One journal file: ``rows`` lines appended so far.
+
+    The first ``settled`` of them have been flushed; ``done`` of those are
+    committed or spilled, the others stay in the file for replay().
+    """
+    __slots__ = ("path", "file", "rows", "settled", "done")
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "a")
+        # Held while the file is open, so replay() in another process knows it is still live
+        fcntl.flock(self.file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self.rows = 0
+        self.settled = 0
+        self.done = 0
+
+
+class HistoryWriter:
+    """Background thread that bulk-inserts Prediction rows.
+
+    Requests hand their rows to submit() and return without waiting for a
+    commit. The thread writes everything that arrived within
+    ``flush_interval`` seconds (or ``flush_rows`` rows, whichever comes
+    first) with one multi-row INSERT and one commit.
+
+    Rows are never dropped:
+
+    - submit() appends them to a journal segment in ``spool_dir`` before
+      queuing them, so a killed or OOM-killed process leaves them on disk.
+      The next start() replays every segment no live process holds.
+    - When more than ``max_queued_rows`` are waiting, or the journal can't
+      be written, submit() refuses them and the caller writes them itself.
+    - A flush is retried HISTORY_WRITE_RETRIES times, then row by row;
+      rows that still fail go to a fsynced ``failed-*.jsonl`` file in
+      ``spool_dir`` instead of blocking later flushes. Rows that can't
+      even be spilled stay in their journal segment.
+    - The writer retries the spool every HISTORY_SPOOL_RETRY_INTERVAL
+      seconds, backing off while the database stays down, so rows reach
+      the database (and /history) once it is back, without a restart.
+
+    Delivery is at least once: a process killed between a commit and its
+    journal update replays that one batch.
+    """
+
+    def __init__(self, session_factory=SessionLocal, flush_rows=HISTORY_FLUSH_ROWS,
+                 flush_interval=HISTORY_FLUSH_INTERVAL, max_queued_rows=HISTORY_MAX_QUEUED_ROWS,
+                 spool_dir=HISTORY_SPOOL_DIR, segment_rows=HISTORY_SPOOL_SEGMENT_ROWS):
+        self.session_factory = session_factory
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.max_queued_rows = max_queued_rows
+        self.spool_dir = spool_dir
+        self.segment_rows = segment_rows
+        self.rows_written = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.rejected_rows = 0
+        self.spilled_rows = 0
+        self.replayed_rows = 0
+        self._queue = queue.Queue()
+        self._queued_rows = 0
+        self._pending_by_owner = Counter()
+        self._segments = deque()
+        self._retry_at = None
+        self._retry_delay = HISTORY_SPOOL_RETRY_INTERVAL
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            os.makedirs(self.spool_dir, exist_ok=True)
+            self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        """Flush everything still queued, then stop the thread"""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, rows) -> bool:
+        """Queue rows for writing; False means the queue is full and the caller must write them"""
+        with self._cond:
+            if self._thread is None or self._queued_rows + len(rows) > self.max_queued_rows:
+                self.rejected_rows += len(rows)
+                return False
+            try:
+                self._journal(rows)
+            except OSError as e:
+                print(f"History writer: journal write failed ({e}), writing synchronously")
+                self.rejected_rows += len(rows)
+                return False
+            self._queued_rows += len(rows)
+            for row in rows:
+                self._pending_by_owner[row["owner_id"]] += 1
+            # Queued under the lock so queue order matches journal order
+            self._queue.put(list(rows))
+        return True
+
+    def wait_until_written(self, owner_id, timeout=None) -> bool:
+        """Block until every queued row for owner_id is committed (read-your-writes)"""
+        with self._cond:
+            if not self._pending_by_owner.get(owner_id):
+                return True
+        self._queue.put(_FLUSH)
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending_by_owner.get(owner_id), timeout)
+
+    def stats(self):
+        return {
+            "queued_rows": self._queued_rows,
+            "rows_written": self.rows_written,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "rejected_rows": self.rejected_rows,
+            "spilled_rows": self.spilled_rows,
+            "replayed_rows": self.replayed_rows,
+        }
+
+    def replay(self):
+        """Write rows left in the spool: journals of dead workers, abandoned segments, failed rows.
+
+        Returns the number of rows that are still in the spool afterwards.
+        """
+        if not os.path.isdir(self.spool_dir):
+            return 0
+        left = 0
+        for name in sorted(os.listdir(self.spool_dir)):
+            if not name.endswith(".jsonl"):
+                continue
+            path = os.path.join(self.spool_dir, name)
+            try:
+                f = open(path)
+            except FileNotFoundError:
+                continue  # claimed by another worker
+            with f:
+                try:
+                    # Fails while the owner (live, in this or another process) has it open
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                try:
+                    # Another worker replayed it (removed or rewrote it) between our open and flock
+                    if os.stat(path).st_ino != os.fstat(f.fileno()).st_ino:
+                        continue
+                except FileNotFoundError:
+                    continue
+                lines = []
+                done = set()
+                for line in f:
+                    if line.startswith('{"_done":'):
+                        # Rows [start, end) were committed (or spilled) by the process that wrote the journal
+                        start, end = json.loads(line)["_done"]
+                        done.update(range(start, end))
+                    elif line.endswith("\n"):
+                        lines.append(line)
+                rows = [decode_row(line) for i, line in enumerate(lines) if i not in done]
+                failed = []
+                if rows:
+                    print(f"History writer: replaying {len(rows)} rows from {name}")
+                    committed, failed = self._store(rows)
+                    self.replayed_rows += committed
+                try:
+                    if not failed:
+                        os.remove(path)
+                    elif len(failed) < len(rows):
+                        # Keep only the rows that still didn't go through
+                        write_spool_file(path, [rows[i] for i in failed])
+                except OSError as e:
+                    print(f"History writer: could not update {name} ({e}); its rows are retried as they were")
+                left += len(failed)
+        return left
+
+    def _journal(self, rows):
+        segment = self._segments[-1] if self._segments else None
+        if segment is None or segment.rows >= self.segment_rows:
+            path = os.path.join(self.spool_dir, f"journal-{os.getpid()}-{time.time_ns()}.jsonl")
+            segment = _Segment(path)
+            self._segments.append(segment)
+        segment.file.write("".join(encode_row(row) + "\n" for row in rows))
+        # Into the OS page cache, which survives the process being killed
+        segment.file.flush()
+        segment.rows += len(rows)
+
+    def _settle(self, n, unsaved=()):
+        """The oldest n unsettled journal rows were flushed; all but the batch positions in unsaved are saved.
+
+        Saved rows are marked done. A segment whose rows are all settled is
+        deleted when they were all saved, and otherwise closed, which lets
+        replay() retry the unsaved rows left in it.
+        """
+        position = 0
+        while n and self._segments:
+            segment = self._segments[0]
+            taken = min(n, segment.rows - segment.settled)
+            start = segment.settled
+            for i in range(taken):
+                if position + i in unsaved:
+                    if start < segment.settled + i:
+                        self._mark_done(segment, start, segment.settled + i)
+                    start = segment.settled + i + 1
+            if start < segment.settled + taken:
+                self._mark_done(segment, start, segment.settled + taken)
+            segment.settled += taken
+            position += taken
+            n -= taken
+            if segment.settled < segment.rows:
+                segment.file.flush()
+                break
+            segment.file.close()
+            if segment.done == segment.rows:
+                os.remove(segment.path)
+            self._segments.popleft()
+
+    @staticmethod
+    def _mark_done(segment, start, end):
+        segment.file.write(json.dumps({"_done": [start, end]}) + "\n")
+        segment.done += end - start
+
+    def _spill(self, rows):
+        """Move rows that can't be written to a durable file, so they don't block later flushes"""
+        path = os.path.join(self.spool_dir, f"failed-{os.getpid()}-{time.time_ns()}.jsonl")
+        write_spool_file(path, rows)
+        self.spilled_rows += len(rows)
+        print(f"History writer: {len(rows)} rows could not be written, saved to {path}")
+
+    def _retry_spool(self):
+        try:
+            left = self.replay()
+        except Exception as e:
+            print(f"History writer: replay failed ({e})")
+            left = 1
+        if left:
+            self._schedule_retry()
+            self._retry_delay = min(self._retry_delay * 2, HISTORY_SPOOL_RETRY_MAX_INTERVAL)
+        else:
+            self._retry_at = None
+            self._retry_delay = HISTORY_SPOOL_RETRY_INTERVAL
+
+    def _schedule_retry(self):
+        if self._retry_at is None or self._retry_at < time.monotonic():
+            self._retry_at = time.monotonic() + self._retry_delay
+
+    def _run(self):
+        self._retry_spool()
+        stopping = False
+        while not stopping:
+            if self._retry_at is not None and time.monotonic() >= self._retry_at:
+                self._retry_spool()
+            batch, stopping = self._collect()
+            if batch:
+                self._write(batch)
+
+    def _collect(self):
+        """Gather rows until the batch is full, the interval elapses, or a flush/stop arrives.
+
+        Returns early with an empty batch when a spool retry is due.
+        """
+        batch = []
+        try:
+            timeout = None if self._retry_at is None else max(self._retry_at - time.monotonic(), 0)
+            item = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return batch, False
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            if item is _STOP or item is _FLUSH:
+                # Take whatever else is already queued and write it now
+                stopping = item is _STOP
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        return batch, stopping
+                    if item is _STOP:
+                        stopping = True
+                    elif item is not _FLUSH:
+                        batch.extend(item)
+            batch.extend(item)
+            remaining = deadline - time.monotonic()
+            if len(batch) >= self.flush_rows or remaining <= 0:
+                return batch, False
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                return batch, False
+
+    def _store(self, batch):
+        """Write a batch with capped retries, then row by row.
+
+        Returns (rows committed, positions in batch of the rows that failed).
+        """
+        for attempt in range(HISTORY_WRITE_RETRIES + 1):
+            try:
+                with HISTORY_FLUSH_SECONDS.time("batch"):
+                    write_rows(self.session_factory, batch)
+                return len(batch), []
+            except Exception as e:
+                self.failed_flushes += 1
+                print(f"History writer: flush of {len(batch)} rows failed ({e}), attempt {attempt + 1}")
+                if attempt < HISTORY_WRITE_RETRIES:
+                    time.sleep(min(2 ** attempt * 0.1, 2.0))
+        # One bad row fails the whole INSERT; keep the others
+        committed = 0
+        failed = []
+        for i, row in enumerate(batch):
+            if not committed and len(failed) > HISTORY_WRITE_RETRIES:
+                # Not a bad row: nothing goes through, so the database is down
+                failed.extend(range(i, len(batch)))
+                break
+            try:
+                with HISTORY_FLUSH_SECONDS.time("row"):
+                    write_rows(self.session_factory, [row])
+                committed += 1
+            except Exception:
+                failed.append(i)
+        return committed, failed
+
+    def _write(self, batch):
+        committed, failed = self._store(batch)
+        unsaved = set()
+        if failed:
+            try:
+                self._spill([batch[i] for i in failed])
+            except OSError as e:
+                # Left in the journal, which the spool retry writes once the segment is closed
+                print(f"History writer: could not spill {len(failed)} rows ({e}); they stay in the journal")
+                unsaved = set(failed)
+            self._schedule_retry()
+        self.flushes += 1
+        self.rows_written += committed
+        with self._cond:
+            self._queued_rows -= len(batch)
+            for row in batch:
+                self._done(row)
+            try:
+                self._settle(len(batch), unsaved)
+            except OSError as e:
+                # The journal keeps rows that are already committed; they'd be written again on replay
+                print(f"History writer: journal update failed ({e})")
+            self._cond.notify_all()
+
+    def _done(self, row):
+        self._pending_by_owner[row["owner_id"]] -= 1
+        if not self._pending_by_owner[row["owner_id"]]:
+            del self._pending_by_owner[row["owner_id"]]
+
+
+def write_rows(session_factory, rows):
+    """One multi-row INSERT, the matching rollup updates, and one commit"""
+    db = session_factory()
+    try:
+        db.execute(insert(Prediction), rows)
+        apply_rollups(db, rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
@@ -1,19 +1,34 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from pydantic import BaseModel
-import joblib
-import numpy as np
-from google.oauth2 import id_token
-from google.auth.transport import requests
 from typing import Optional, List
+from datetime import date, datetime, timedelta
+from sqlalchemy import insert, and_, or_
 from sqlalchemy.orm import Session
-from jose import JWTError, jwt
+import base64
+import math
 import os
+import secrets
 
 # Internal imports
-from database import SessionLocal, init_db, User, Prediction
-from auth import verify_password, get_password_hash, create_access_token, SECRET_KEY, ALGORITHM
+from database import SessionLocal, init_db, pool_stats, User, Prediction
+from auth import (
+    verify_password, get_password_hash, create_access_token, decode_access_token,
+    claims_cache, principal_cache, invalidate_user, CurrentUser,
+)
+from encoders import UnknownCategoryError
+from artifacts import bundle_exists
+from registry import current_version, list_versions, set_current, version_dir
+from reloader import ModelReloader, ServingModel
+from cache import LRUTTLCache
+from concurrency import run_cpu, run_io, shutdown as shutdown_executors
+from size_parser import parse_size
+from history_writer import HistoryWriter
+from rollups import GROUP_COLUMNS, apply_rollups, query_rollups
+from metrics import MetricsMiddleware, phase, register_collector, render as render_metrics
+from profiler import SlowRequestProfiler
 
 app = FastAPI(title="Land Price Prediction API with Auth")
 
@@ -29,6 +44,7 @@ if ALLOW_ALL:
         allow_credentials=False, # Credentials cannot be true with "*"
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Next-Cursor"],
     )
 else:
     # If specific origins are set, we use them. 
@@ -42,8 +58,20 @@ else:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Next-Cursor"],
     )
 
+# Request/phase timing for /metrics. The sampling profiler is off unless PROFILE_SLOW_REQUESTS_MS > 0
+# (or it is switched on through /admin/profiler); it then dumps folded stacks for slower requests.
+PROFILE_SLOW_REQUESTS_MS = float(os.environ.get("PROFILE_SLOW_REQUESTS_MS", 0))
+profiler = SlowRequestProfiler(
+    enabled=PROFILE_SLOW_REQUESTS_MS > 0,
+    threshold_ms=PROFILE_SLOW_REQUESTS_MS or 500,
+    interval=float(os.environ.get("PROFILE_INTERVAL_MS", 5)) / 1000,
+    output_dir=os.environ.get("PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")),
+)
+app.add_middleware(MetricsMiddleware, profiler=profiler)
+
 # Database Dependency
 def get_db():
     db = SessionLocal()
@@ -55,22 +83,32 @@ def get_db():
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 # --- AUTH LOGIC ---
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+# Sync dependency: FastAPI runs it (and its users-table query) in the threadpool
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    # Imported here, like google-auth, to keep python-jose off the startup path (see auth.py)
+    from jose import JWTError
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        with phase("auth"):
+            payload = decode_access_token(token)
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = db.query(User).filter(User.username == username).first()
-    if user is None:
-        raise credentials_exception
+    with phase("user_lookup"):
+        user = principal_cache.get(username)
+        if user is None:
+            db_user = db.query(User).filter(User.username == username).first()
+            if db_user is None:
+                raise credentials_exception
+            user = CurrentUser(db_user.id, db_user.username, db_user.email)
+            principal_cache.set(username, user)
     return user
 
 # --- Pydantic Models ---
@@ -101,6 +139,30 @@ GOOGLE_CLIENT_ID = os.environ.get("GOOGLE_CLIENT_ID", "YOUR_GOOGLE_CLIENT_ID.app
 class PredictionResponse(BaseModel):
     predicted_price: float
     formatted_price: str
+    model_version: str
+
+class SizeSweep(BaseModel):
+    # Inclusive range in sqft, e.g. 500..3000 step 100
+    start: float
+    stop: float
+    step: float
+
+class PriceCurveRequest(BaseModel):
+    # The listing held fixed; each axis that is set replaces its field with a sweep
+    base: PredictionRequest
+    size: Optional[SizeSweep] = None
+    beds: Optional[List[int]] = None
+    baths: Optional[List[int]] = None
+
+class PriceCurveResponse(BaseModel):
+    # Swept axes in the order size, beds, baths; prices is nested in the same order
+    axes: dict
+    prices: list
+    model_version: str
+
+class ReloadRequest(BaseModel):
+    # Activate this published version first (deploy or roll back); omit to reload CURRENT
+    version: Optional[str] = None
 
 class HistoryResponse(BaseModel):
     id: int
@@ -114,43 +176,132 @@ base_dir = os.path.dirname(os.path.abspath(__file__))
 MODEL_PATH = os.path.join(base_dir, "models", "model.pkl")
 ENCODERS_PATH = os.path.join(base_dir, "models", "label_encoders.pkl")
 METADATA_PATH = os.path.join(base_dir, "models", "metadata.pkl")
+MAP_PATH = os.path.join(base_dir, "city_neighborhood_map.json")
+BUNDLE_DIR = os.environ.get("MODEL_BUNDLE_DIR", os.path.join(base_dir, "models", "bundle"))
+REGISTRY_DIR = os.environ.get("MODEL_REGISTRY_DIR", os.path.join(base_dir, "models", "registry"))
+# Worker processes serving the app (uvicorn --workers and gunicorn both read WEB_CONCURRENCY)
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", 1))
+# Seconds between checks of the registry for a new CURRENT version; 0 disables the watcher.
+# /admin/model/reload only swaps the worker that receives it, so with several workers the
+# watcher is on by default and carries a deploy or rollback to the others.
+MODEL_WATCH_INTERVAL = float(os.environ.get("MODEL_WATCH_INTERVAL", 5 if WEB_CONCURRENCY > 1 else 0))
+# Required in the X-Admin-Token header by /admin endpoints; unset disables them
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+
+# "flat" serves the forest from flattened NumPy arrays, "sklearn" uses the pickled estimator
+MODEL_ENGINE = os.environ.get("MODEL_ENGINE", "flat")
+# Load the model on a background thread so the worker answers /healthz (and /ready with 503)
+# immediately; set to false to block startup until the model is loaded
+MODEL_LOAD_IN_BACKGROUND = os.environ.get("MODEL_LOAD_IN_BACKGROUND", "true").lower() in ("1", "true", "yes")
+# Version reported for artifacts loaded from outside the registry
+UNVERSIONED = "unversioned"
+
+def load_artifacts(version=None):
+    """Return (version, model, encoder classes by feature, feature names, neighborhood map path).
+
+    version defaults to CURRENT. A bundle's own map is used when it has one,
+    so /options matches the encoders being served; otherwise MAP_PATH.
+    """
+    # Imported here, on the loader thread, so NumPy (and sklearn for pickles) stay out of the import path
+    from artifacts import bundle_map_path, load_bundle
+
+    if MODEL_ENGINE == "flat":
+        version = version or current_version(REGISTRY_DIR)
+        if version is not None:
+            bundle_dir = version_dir(REGISTRY_DIR, version)
+            forest, encoder_classes, metadata = load_bundle(bundle_dir)
+            return version, forest, encoder_classes, metadata['feature_names'], bundle_map_path(bundle_dir) or MAP_PATH
+        if bundle_exists(BUNDLE_DIR):
+            # Memory-mapped bundle: loads in milliseconds and shares pages across workers
+            forest, encoder_classes, metadata = load_bundle(BUNDLE_DIR)
+            return UNVERSIONED, forest, encoder_classes, metadata['feature_names'], bundle_map_path(BUNDLE_DIR) or MAP_PATH
+
+    import joblib
+    from forest import export_forest
+
+    model = joblib.load(MODEL_PATH)
+    if MODEL_ENGINE == "flat":
+        # No bundle yet: flatten the pickle so sklearn stays off the request path
+        model = export_forest(model)
+    label_encoders = joblib.load(ENCODERS_PATH)
+    metadata = joblib.load(METADATA_PATH)
+    encoder_classes = {name: encoder.classes_ for name, encoder in label_encoders.items()}
+    return UNVERSIONED, model, encoder_classes, metadata['feature_names'], MAP_PATH
 
-model = None
-label_encoders = None
-feature_names = None
+def load_serving_model(version=None):
+    return ServingModel(*load_artifacts(version))
+
+def on_model_swap(previous, serving):
+    # Cache keys carry the version, so this only frees entries the new model can't hit
+    prediction_cache.clear()
+
+# Requests read reloader.current once and use that ServingModel throughout
+reloader = ModelReloader(
+    load_serving_model,
+    fingerprint=lambda: current_version(REGISTRY_DIR),
+    watch_interval=MODEL_WATCH_INTERVAL,
+    on_swap=on_model_swap,
+)
+
+def get_serving_model() -> ServingModel:
+    serving = reloader.current
+    if serving is None:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    return serving
 
 @app.on_event("startup")
 async def startup_event():
-    global model, label_encoders, feature_names
     try:
         init_db() # Initialize DB tables
-        model = joblib.load(MODEL_PATH)
-        label_encoders = joblib.load(ENCODERS_PATH)
-        metadata = joblib.load(METADATA_PATH)
-        feature_names = metadata['feature_names']
-        print("Backend: Model and Database initialized.")
+        history_writer.start()
+        if MODEL_LOAD_IN_BACKGROUND:
+            reloader.load_in_background()
+            print(f"Backend: Database initialized, loading model ({MODEL_ENGINE} engine) in the background.")
+        else:
+            serving = reloader.load()
+            reloader.start_watch()
+            print(f"Backend: Model {serving.version} ({MODEL_ENGINE} engine) and Database initialized.")
     except Exception as e:
         print(f"Startup error: {e}")
         # We don't want to crash the whole app here, so we log it
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    reloader.stop_watch()
+    profiler.disable()
+    # Commit every queued history row before the worker exits; rows still unwritten stay journaled
+    # in HISTORY_SPOOL_DIR and are written by the next worker to start
+    history_writer.stop()
+    shutdown_executors()
+
+
 # --- AUTH ENDPOINTS ---
+def find_user(db: Session, **filters):
+    return db.query(User).filter_by(**filters).first()
+
+def create_user(db: Session, username: str, email: str, hashed_password: str):
+    user = User(username=username, email=email, hashed_password=hashed_password)
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    invalidate_user(username)
+    return user
+
 @app.post("/register")
 async def register(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.username == user.username).first()
+    db_user = await run_io(find_user, db, username=user.username)
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
     
-    hashed_password = get_password_hash(user.password)
-    new_user = User(username=user.username, email=user.email, hashed_password=hashed_password)
-    db.add(new_user)
-    db.commit()
+    hashed_password = await run_cpu("hash", get_password_hash, user.password)
+    await run_io(create_user, db, user.username, user.email, hashed_password)
     return {"message": "User created successfully"}
 
 @app.post("/token", response_model=Token)
 async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    user = await run_io(find_user, db, username=form_data.username)
+    if not user or not await run_cpu("hash", verify_password, form_data.password, user.hashed_password):
         raise HTTPException(status_code=400, detail="Incorrect username or password")
     
     access_token = create_access_token(data={"sub": user.username})
@@ -158,25 +309,26 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
 
 @app.post("/google-login", response_model=Token)
 async def google_login(request: GoogleLoginRequest, db: Session = Depends(get_db)):
+    # google-auth (and requests) cost ~150 ms to import, so only Google sign-ins pay for them
+    from google.oauth2 import id_token
+    from google.auth.transport import requests
+
     try:
-        # Verify the Google token
-        idinfo = id_token.verify_oauth2_token(request.credential, requests.Request(), GOOGLE_CLIENT_ID)
+        # Verify the Google token (fetches Google's certs over HTTP)
+        idinfo = await run_io(id_token.verify_oauth2_token, request.credential, requests.Request(), GOOGLE_CLIENT_ID)
         
         # ID token is valid. Get user info from ID token.
         email = idinfo['email']
         name = idinfo.get('name', email.split('@')[0])
         
         # Check if user exists
-        user = db.query(User).filter(User.email == email).first()
+        user = await run_io(find_user, db, email=email)
         
         if not user:
             # Create a new user if not exists
             # We use a random password hash for Google users as they won't use it
-            hashed_random = get_password_hash("google_oauth_" + email)
-            user = User(username=name, email=email, hashed_password=hashed_random)
-            db.add(user)
-            db.commit()
-            db.refresh(user)
+            hashed_random = await run_cpu("hash", get_password_hash, "google_oauth_" + email)
+            user = await run_io(create_user, db, name, email, hashed_random)
             
         access_token = create_access_token(data={"sub": user.username})
         return {"access_token": access_token, "token_type": "bearer"}
@@ -185,67 +337,249 @@ async def google_login(request: GoogleLoginRequest, db: Session = Depends(get_db
         raise HTTPException(status_code=400, detail="Invalid Google token")
 
 # --- PREDICTION LOGIC ---
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", 5000))
+MAX_CURVE_POINTS = int(os.environ.get("MAX_CURVE_POINTS", 20000))
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", 10000))
+PREDICTION_CACHE_TTL = float(os.environ.get("PREDICTION_CACHE_TTL", 3600))
+
+# History rows are committed in bulk by a background thread, off the request path
+history_writer = HistoryWriter()
+
+# Keyed on the encoded feature vector, so url/date and spelling of the size don't matter
+prediction_cache = LRUTTLCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL)
+
+def build_feature_matrix(serving: ServingModel, rows: List[dict]):
+    """Assemble the model input for many requests as one 2-D array"""
+    import numpy as np
+
+    matrix = np.zeros((len(rows), len(serving.feature_names)))
+    for j, feature_name in enumerate(serving.feature_names):
+        column = [row.get(feature_name, 0) for row in rows]
+        if feature_name in serving.encoder_tables:
+            matrix[:, j] = serving.encoder_tables[feature_name].encode_many(column)
+        elif feature_name == 'size':
+            matrix[:, j] = [parse_size(value) for value in column]
+        else:
+            matrix[:, j] = column
+    return matrix
+
+def predict_prices(serving: ServingModel, features_array) -> List[float]:
+    """Score a feature matrix, serving repeated feature vectors from the cache"""
+    # Prefixed with the version so a request still finishing on the old model can't poison the new one
+    prefix = serving.version.encode() + b"|"
+    keys = [prefix + row.tobytes() for row in features_array]
+    prices = [prediction_cache.get(key) for key in keys]
+    misses = [i for i, price in enumerate(prices) if price is None]
+    if misses:
+        for i, price in zip(misses, serving.model.predict(features_array[misses])):
+            prices[i] = float(price)
+            prediction_cache.set(keys[i], prices[i])
+    return prices
+
+def score_rows(serving: ServingModel, rows: List[dict]) -> List[float]:
+    with phase("encode"):
+        features = build_feature_matrix(serving, rows)
+    with phase("inference"):
+        return predict_prices(serving, features)
+
+def sweep_values(sweep: SizeSweep) -> List[float]:
+    bounds = (sweep.start, sweep.stop, sweep.step)
+    if not all(map(math.isfinite, bounds)) or sweep.step <= 0 or sweep.start <= 0 or sweep.stop < sweep.start:
+        raise ValueError("Size sweep needs finite 0 < start <= stop and step > 0")
+    # Checked before int(), which raises OverflowError when the ratio overflows to inf
+    intervals = (sweep.stop - sweep.start) / sweep.step + 1e-9
+    if not (math.isfinite(intervals) and intervals < MAX_CURVE_POINTS):
+        raise ValueError(f"Size sweep has too many points, limit is {MAX_CURVE_POINTS}")
+    count = int(intervals) + 1
+    return [sweep.start + i * sweep.step for i in range(count)]
+
+def curve_axes(request: PriceCurveRequest) -> dict:
+    """Swept values by feature name, validated, in response order"""
+    axes = {}
+    if request.size is not None:
+        axes["size"] = sweep_values(request.size)
+    for name in ("beds", "baths"):
+        values = getattr(request, name)
+        if values is not None:
+            if not values:
+                raise ValueError(f"{name.capitalize()} sweep is empty")
+            axes[name] = values
+    if not axes:
+        raise ValueError("Set at least one of size, beds, baths to sweep")
+    points = 1
+    for values in axes.values():
+        points *= len(values)
+    if points > MAX_CURVE_POINTS:
+        raise ValueError(f"Grid has {points} points, limit is {MAX_CURVE_POINTS}")
+    return axes
+
+def score_curve(serving: ServingModel, base: dict, axes: dict):
+    """Price every point of the sweep grid with one model call; returns an array shaped like the grid"""
+    import numpy as np
+
+    shape = tuple(len(values) for values in axes.values())
+    with phase("encode"):
+        # Categoricals and fixed fields are encoded once, then that row is tiled over the grid
+        row = build_feature_matrix(serving, [base])[0]
+        features = np.tile(row, (int(np.prod(shape)), 1))
+        grids = np.meshgrid(*(np.asarray(values, dtype=np.float64) for values in axes.values()), indexing="ij")
+        for name, grid in zip(axes, grids):
+            if name not in serving.feature_names:
+                raise ValueError(f"Model {serving.version} has no '{name}' feature to sweep")
+            features[:, serving.feature_names.index(name)] = grid.ravel()
+    with phase("inference"):
+        # Skips prediction_cache: grid points are rarely asked for again and would evict real entries
+        return np.asarray(serving.model.predict(features), dtype=np.float64).reshape(shape)
+
+def save_history(db: Session, rows: List[dict]):
+    if len(rows) == 1:
+        db.add(Prediction(**rows[0]))
+    else:
+        db.execute(insert(Prediction), rows)
+    # INSERT before the rollup read, as in HistoryWriter's flush (see apply_rollups)
+    db.flush()
+    apply_rollups(db, rows)
+    db.commit()
+
+async def record_history(db: Session, rows: List[dict]):
+    # Times queueing (or the synchronous fallback); the writer's own flushes
+    # are in history_flush_duration_seconds
+    with phase("history", sample=False):
+        if not history_writer.submit(rows):
+            # Writer is backed up (or not running): write synchronously instead of dropping rows
+            await run_io(save_history, db, rows)
+
+def format_price(price: float) -> str:
+    return f"₹{price:,.2f}"
+
+def history_row(request: PredictionRequest, price: float, owner_id: int) -> dict:
+    return {
+        "city": request.city,
+        "neighborhood": request.neighborhood,
+        "beds": request.beds,
+        "baths": request.baths,
+        "size": request.size,
+        "property_type": request.type,
+        "predicted_price": price,
+        "owner_id": owner_id,
+        "timestamp": datetime.utcnow(),
+    }
+
 @app.post("/predict", response_model=PredictionResponse)
 async def predict(
     request: PredictionRequest, 
     db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_current_user)
+    current_user: Optional[CurrentUser] = Depends(get_current_user)
 ):
+    serving = get_serving_model()
     try:
-        data = request.dict()
-        features = []
-        for feature_name in feature_names:
-            value = data.get(feature_name, 0)
-            if feature_name in label_encoders:
-                encoder = label_encoders[feature_name]
-                try:
-                    encoded_value = encoder.transform([str(value)])[0]
-                except:
-                    encoded_value = 0
-                features.append(encoded_value)
-            else:
-                # Handle size string (strip 'sqft' and handle ranges)
-                if feature_name == 'size' and isinstance(value, str):
-                    try:
-                        clean_val = value.lower().replace('sqft', '').strip()
-                        if '-' in clean_val:
-                            parts = clean_val.split('-')
-                            value = (float(parts[0].strip()) + float(parts[1].strip())) / 2
-                        else:
-                            value = float(clean_val)
-                    except:
-                        value = 0
-                features.append(value)
-        
-        features_array = np.array([features])
-        prediction = model.predict(features_array)[0]
-        formatted_price = f"₹{prediction:,.2f}"
+        prediction = (await run_cpu("inference", score_rows, serving, [request.dict()]))[0]
 
         # Save to history if user is logged in
         if current_user:
-            new_prediction = Prediction(
-                city=request.city,
-                neighborhood=request.neighborhood,
-                beds=request.beds,
-                baths=request.baths,
-                size=request.size,
-                property_type=request.type,
-                predicted_price=float(prediction),
-                owner_id=current_user.id
-            )
-            db.add(new_prediction)
-            db.commit()
+            await record_history(db, [history_row(request, prediction, current_user.id)])
         
         return PredictionResponse(
-            predicted_price=float(prediction),
-            formatted_price=formatted_price
+            predicted_price=prediction,
+            formatted_price=format_price(prediction),
+            model_version=serving.version,
         )
+    except UnknownCategoryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/predict/batch", response_model=List[PredictionResponse])
+async def predict_batch(
+    batch: List[PredictionRequest],
+    db: Session = Depends(get_db),
+    current_user: Optional[CurrentUser] = Depends(get_current_user)
+):
+    if len(batch) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"Batch size exceeds limit of {MAX_BATCH_SIZE}")
+    if not batch:
+        return []
+    serving = get_serving_model()
+    try:
+        # One encoding pass and one model call for the whole batch
+        predictions = await run_cpu("inference", score_rows, serving, [r.dict() for r in batch])
+
+        # Queue the whole batch for one bulk insert
+        if current_user:
+            await record_history(db, [
+                history_row(r, p, current_user.id) for r, p in zip(batch, predictions)
+            ])
+
+        return [
+            PredictionResponse(predicted_price=p, formatted_price=format_price(p), model_version=serving.version)
+            for p in predictions
+        ]
+    except UnknownCategoryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/predict/curve", response_model=PriceCurveResponse)
+async def predict_curve(
+    request: PriceCurveRequest,
+    current_user: Optional[CurrentUser] = Depends(get_current_user)
+):
+    # What-if analysis rather than a real listing, so nothing is written to history
+    try:
+        axes = curve_axes(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    serving = get_serving_model()
+    try:
+        prices = await run_cpu("inference", score_curve, serving, request.base.dict(), axes)
+        return PriceCurveResponse(axes=axes, prices=prices.tolist(), model_version=serving.version)
+    except (UnknownCategoryError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+HISTORY_PAGE_SIZE = int(os.environ.get("HISTORY_PAGE_SIZE", 50))
+MAX_HISTORY_PAGE_SIZE = int(os.environ.get("MAX_HISTORY_PAGE_SIZE", 500))
+
+def encode_history_cursor(timestamp: datetime, id: int) -> str:
+    raw = f"{timestamp.isoformat()}|{id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_history_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(timestamp), int(id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 @app.get("/history")
-async def get_history(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    history = db.query(Prediction).filter(Prediction.owner_id == current_user.id).order_by(Prediction.timestamp.desc()).all()
+def get_history(
+    response: Response,
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=MAX_HISTORY_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Newest-first history page; pass the X-Next-Cursor header back as ?cursor= for the next one"""
+    # Make the user's own just-submitted predictions visible
+    history_writer.wait_until_written(current_user.id, timeout=5)
+
+    # Keyset pagination over the (owner_id, timestamp, id) index, selecting only the columns we return
+    query = db.query(
+        Prediction.id, Prediction.city, Prediction.neighborhood, Prediction.predicted_price, Prediction.timestamp
+    ).filter(Prediction.owner_id == current_user.id)
+    if cursor:
+        timestamp, id = decode_history_cursor(cursor)
+        query = query.filter(or_(
+            Prediction.timestamp < timestamp,
+            and_(Prediction.timestamp == timestamp, Prediction.id < id),
+        ))
+    history = query.order_by(Prediction.timestamp.desc(), Prediction.id.desc()).limit(limit + 1).all()
+
+    if len(history) > limit:
+        history = history[:limit]
+        response.headers["X-Next-Cursor"] = encode_history_cursor(history[-1].timestamp, history[-1].id)
     return [{
         "id": h.id,
         "city": h.city,
@@ -254,40 +588,190 @@ async def get_history(current_user: User = Depends(get_current_user), db: Sessio
         "timestamp": h.timestamp.strftime("%Y-%m-%d %H:%M:%S")
     } for h in history]
 
+# --- ANALYTICS ---
+ANALYTICS_DEFAULT_DAYS = int(os.environ.get("ANALYTICS_DEFAULT_DAYS", 30))
+ANALYTICS_MAX_DAYS = int(os.environ.get("ANALYTICS_MAX_DAYS", 366))
+
+def parse_quantiles(quantiles: str) -> List[float]:
+    try:
+        values = [float(q) for q in quantiles.split(",") if q.strip()]
+    except ValueError:
+        values = [-1.0]
+    if not all(0 <= q <= 1 for q in values):
+        raise HTTPException(status_code=400, detail="quantiles must be comma-separated numbers in [0, 1]")
+    return values
+
+@app.get("/analytics/rollups")
+def get_rollups(
+    group_by: str = "day",
+    city: Optional[str] = None,
+    neighborhood: Optional[str] = None,
+    type: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    quantiles: str = "0.5,0.9",
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Predicted-price count/mean/min/max/quantiles per group, over a range of UTC days.
+
+    group_by is a comma-separated subset of day, city, neighborhood, type (empty for one
+    overall row). Reads the prediction_rollups cells in the range, never the predictions.
+    """
+    group_by = [g.strip() for g in group_by.split(",") if g.strip()]
+    unknown = [g for g in group_by if g not in GROUP_COLUMNS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown group_by: {', '.join(unknown)}")
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=ANALYTICS_DEFAULT_DAYS - 1)
+    if start > end or (end - start).days >= ANALYTICS_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"start must be before end, at most {ANALYTICS_MAX_DAYS} days apart")
+    qs = parse_quantiles(quantiles)
+
+    groups = query_rollups(db, start, end, group_by, city=city, neighborhood=neighborhood, property_type=type)
+    return [
+        {**{name: (value.isoformat() if name == "day" else value) for name, value in zip(group_by, key)},
+         **rollup.summary(qs)}
+        for key, rollup in groups
+    ]
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the worker is up and serving, whether or not the model has loaded"""
+    return {"status": "ok"}
+
+@app.get("/ready")
+async def ready(response: Response):
+    """Readiness: 200 once a model is loaded, 503 while it is still loading (or failed to)"""
+    if reloader.current is None:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return {"status": "failed" if reloader.last_error else "loading", "error": reloader.last_error}
+    return {"status": "ready", "model_version": reloader.current.version}
+
 @app.get("/me")
-async def read_users_me(current_user: User = Depends(get_current_user)):
+async def read_users_me(current_user: CurrentUser = Depends(get_current_user)):
     return {"username": current_user.username, "email": current_user.email}
 
 @app.get("/options")
-async def get_options():
-    import json
-    import os
-    
-    cities = []
-    types = []
-    mapping = {}
-    
-    if label_encoders:
-        cities = sorted(list(label_encoders['city'].classes_))
-        types = sorted(list(label_encoders['type'].classes_))
-        
-    # Use absolute path for the mapping file
-    base_path = os.path.dirname(os.path.abspath(__file__))
-    map_path = os.path.join(base_path, "city_neighborhood_map.json")
-    
-    if os.path.exists(map_path):
-        with open(map_path, "r") as f:
-            mapping = json.load(f)
-            print(f"Backend: Mapping loaded successfully from {map_path}")
-    else:
-        print(f"Backend: Mapping file NOT found at {map_path}")
-            
+async def get_options(request: Request):
+    # Built once per artifact load; supports If-None-Match and gzip
+    if reloader.current is None:
+        raise HTTPException(status_code=503, detail="Options not loaded")
+    return reloader.current.options.response(request)
+
+@app.get("/options/{city}")
+async def get_city_options(city: str, request: Request):
+    payload = reloader.current.city_options.get(city) if reloader.current else None
+    if payload is None:
+        raise HTTPException(status_code=404, detail=f"Unknown city: '{city}'")
+    return payload.response(request)
+
+# --- METRICS ---
+@register_collector
+def collect_runtime_metrics():
+    pool = pool_stats()
+    caches = {"prediction": prediction_cache, "token_claims": claims_cache, "user": principal_cache}
+    cache_stats = {name: cache.stats() for name, cache in caches.items()}
+    writer = history_writer.stats()
+    families = [
+        ("cache_entries", "gauge", "Entries held per cache",
+         [({"cache": name}, stats["size"]) for name, stats in cache_stats.items()]),
+        ("cache_hits_total", "counter", "Cache hits",
+         [({"cache": name}, stats["hits"]) for name, stats in cache_stats.items()]),
+        ("cache_misses_total", "counter", "Cache misses",
+         [({"cache": name}, stats["misses"]) for name, stats in cache_stats.items()]),
+        ("cache_evictions_total", "counter", "Entries evicted for space",
+         [({"cache": name}, stats["evictions"]) for name, stats in cache_stats.items()]),
+        ("history_queued_rows", "gauge", "History rows waiting for the background writer",
+         [({}, writer["queued_rows"])]),
+        ("history_rows_written_total", "counter", "History rows committed by the background writer",
+         [({}, writer["rows_written"])]),
+        ("history_failed_flushes_total", "counter", "History flush attempts that failed",
+         [({}, writer["failed_flushes"])]),
+        ("history_rejected_rows_total", "counter", "History rows written synchronously because the queue was full",
+         [({}, writer["rejected_rows"])]),
+        ("history_spilled_rows_total", "counter", "History rows that kept failing and were saved to the spool directory",
+         [({}, writer["spilled_rows"])]),
+        ("history_replayed_rows_total", "counter", "History rows recovered from the spool directory at startup",
+         [({}, writer["replayed_rows"])]),
+        ("model_info", "gauge", "The model version being served",
+         [({"version": reloader.current.version if reloader.current else "", "engine": MODEL_ENGINE}, 1)]),
+        ("model_reloads_total", "counter", "Successful model loads", [({}, reloader.reloads)]),
+    ]
+    if "size" in pool:
+        families.append(("db_pool_connections", "gauge", "Database pool connections by state", [
+            ({"state": "checked_out"}, pool["checked_out"]),
+            ({"state": "checked_in"}, pool["checked_in"]),
+            ({"state": "overflow"}, max(0, pool["overflow"])),
+        ]))
+        families.append(("db_pool_size", "gauge", "Configured database pool size", [({}, pool["size"])]))
+    return families
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# --- MODEL ADMIN ---
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.get("/admin/model", dependencies=[Depends(require_admin)])
+async def get_model_status():
+    return {
+        **reloader.stats(),
+        "engine": MODEL_ENGINE,
+        "current": current_version(REGISTRY_DIR),
+        "versions": list_versions(REGISTRY_DIR),
+    }
+
+def activate_and_load(version: Optional[str]):
+    if version is None:
+        return reloader.load()
+    if MODEL_ENGINE != "flat":
+        # The sklearn engine always serves models/model.pkl; activating a version would only
+        # rewrite CURRENT for the other workers while this one kept serving the pickle
+        raise ValueError(f"Activating a registry version needs MODEL_ENGINE=flat (this worker runs '{MODEL_ENGINE}')")
+    if version not in list_versions(REGISTRY_DIR):
+        raise ValueError(f"Unknown model version: '{version}'")
+    # CURRENT is rewritten only after the version has loaded here, so a bad bundle never becomes
+    # what restarting (or watching) workers load
+    return reloader.load(version, publish=lambda v: set_current(REGISTRY_DIR, v))
+
+@app.post("/admin/model/reload", dependencies=[Depends(require_admin)])
+async def reload_model(body: Optional[ReloadRequest] = None):
+    """Load CURRENT (or activate body.version) in the background and swap it in"""
+    previous = reloader.current.version if reloader.current else None
+    try:
+        # Runs on a worker thread; predictions keep using the old model until the swap
+        serving = await run_io(activate_and_load, body.version if body else None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Reload failed, still serving {previous}: {e}")
     return {
-        "cities": cities,
-        "types": types,
-        "neighborhood_mapping": mapping
+        "previous_version": previous,
+        "version": serving.version,
+        # Only this worker has swapped; the others follow through their watchers, if running
+        "other_workers": f"follow within {MODEL_WATCH_INTERVAL:g}s" if reloader.watching
+                         else "unchanged until restart (set MODEL_WATCH_INTERVAL > 0)",
     }
 
+class ProfilerRequest(BaseModel):
+    enabled: bool
+    threshold_ms: Optional[float] = None
+
+@app.post("/admin/profiler", dependencies=[Depends(require_admin)])
+async def toggle_profiler(body: ProfilerRequest):
+    """Switch the slow-request sampling profiler on or off at runtime"""
+    if body.enabled:
+        profiler.enable(body.threshold_ms)
+    else:
+        profiler.disable()
+    return profiler.stats()
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORT", 8000))
@@ -0,0 +1,210 @@
+import bisect
+import contextvars
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# Prometheus-style metrics without a client library: histograms and
+# counters updated in-process, plus collectors that read gauges (pool,
+# cache and writer stats) at scrape time. render() produces the text
+# exposition format served on /metrics.
+PREFIX = "lumina_"
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_metrics = []
+_collectors = []
+
+
+def escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label_value(value)}"' for name, value in labels.items()) + "}"
+
+
+def format_value(value):
+    if value is None:
+        return "NaN"
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(int(value))
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = PREFIX + name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def observe(self, value, *labelvalues):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *labelvalues):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labelvalues)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = {labels: (list(counts), total, n) for labels, (counts, total, n) in self._series.items()}
+        for labelvalues, (counts, total, n) in sorted(series.items()):
+            labels = dict(zip(self.labelnames, labelvalues))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket{format_labels({**labels, 'le': format_value(float(bound))})} {cumulative}"
+            yield f"{self.name}_sum{format_labels(labels)} {format_value(total)}"
+            yield f"{self.name}_count{format_labels(labels)} {n}"
+
+
+class CounterMetric:
+    def __init__(self, name, help, labelnames=()):
+        self.name = PREFIX + name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = Counter()
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def inc(self, amount=1, *labelvalues):
+        with self._lock:
+            self._values[labelvalues] += amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = dict(self._values)
+        for labelvalues, value in sorted(values.items()):
+            yield f"{self.name}{format_labels(dict(zip(self.labelnames, labelvalues)))} {format_value(value)}"
+
+
+def register_collector(func):
+    """func() returns [(name, type, help, [(labels, value), ...]), ...], read on every scrape"""
+    _collectors.append(func)
+    return func
+
+
+def render() -> str:
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        try:
+            families = collector()
+        except Exception as e:
+            lines.append(f"# collector {getattr(collector, '__name__', collector)} failed: {e}")
+            continue
+        for name, kind, help, samples in families:
+            lines.append(f"# HELP {PREFIX}{name} {help}")
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+            lines.extend(f"{PREFIX}{name}{format_labels(labels)} {format_value(value)}" for labels, value in samples)
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Request latency by route template and status",
+    ("method", "route", "status"),
+)
+PHASE_SECONDS = Histogram(
+    "request_phase_duration_seconds", "Time spent in each phase of a request (auth, encode, inference, ...)",
+    ("phase",),
+)
+HISTORY_FLUSH_SECONDS = Histogram(
+    "history_flush_duration_seconds",
+    "History writer flush time (INSERT, rollups, commit), per whole batch or per row after a batch failed",
+    ("mode",),
+)
+
+
+class RequestTrace:
+    """Per-request phase timings, and sampled stacks when the profiler is on"""
+    __slots__ = ("phases", "profiler", "samples")
+
+    def __init__(self, profiler=None):
+        self.phases = {}
+        self.profiler = profiler
+        self.samples = Counter()
+
+
+# Set by MetricsMiddleware; FastAPI's threadpool and run_cpu copy the context into worker threads
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+@contextmanager
+def phase(name, sample=True):
+    """Time a block as one phase of the current request.
+
+    ``sample=False`` keeps the profiler off the block: use it for phases
+    that await on the event loop, where the thread's stack belongs to
+    whichever request happens to be running.
+    """
+    trace = current_trace.get()
+    sampling = trace is not None and trace.profiler is not None and sample
+    if sampling:
+        trace.profiler.attach(trace, name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if sampling:
+            trace.profiler.detach()
+        PHASE_SECONDS.observe(elapsed, name)
+        if trace is not None:
+            trace.phases[name] = trace.phases.get(name, 0.0) + elapsed
+
+
+class MetricsMiddleware:
+    """Times every HTTP request and gives it a RequestTrace (pure ASGI, no per-request task)"""
+
+    def __init__(self, app, profiler=None):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        profiler = self.profiler if self.profiler is not None and self.profiler.enabled else None
+        trace = RequestTrace(profiler)
+        token = current_trace.set(trace)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            current_trace.reset(token)
+            # The route template, not the raw path, so /options/{city} is one series
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_SECONDS.observe(elapsed, scope["method"], route, str(status))
+            if profiler is not None:
+                profiler.finish(trace, f"{scope['method']} {route}", elapsed)
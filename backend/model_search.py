@@ -0,0 +1,157 @@
+"""Parallel hyperparameter search for the price forest.
+
+Every candidate in the grid is scored with k-fold cross-validation on the
+training split. One (candidate, fold) fit is one task on a process pool.
+The training matrix is written once as a float32 .npy file, and each
+worker memory-maps it in its initializer. Tasks then carry only a
+candidate index and a fold number, and all workers share one page-cache
+copy of the data instead of each unpickling its own.
+
+Accuracy isn't the only cost. Each candidate's fold-0 forest is exported
+to the flat serving format, and the parent process times it, with the
+pool idle, on single rows and on a batch. Among the candidates whose CV
+MAE is within ``mae_tolerance`` of the best, the fastest single-row
+forest wins, and size breaks ties.
+"""
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_absolute_error, r2_score
+from sklearn.model_selection import KFold, ParameterGrid
+
+from artifacts import save_bundle, load_bundle
+from forest import export_forest
+
+PARAM_GRID = {
+    "n_estimators": [25, 50, 100],
+    "max_depth": [None, 20, 12],
+    "min_samples_leaf": [1, 5, 20],
+}
+RANDOM_STATE = 42
+LATENCY_REPEATS = 200
+LATENCY_BATCH_ROWS = 256
+
+# Per-worker state, set once by init_worker
+_X = None
+_y = None
+_folds = None
+
+
+def init_worker(x_path, y_path, n_folds):
+    global _X, _y, _folds
+    _X = np.load(x_path, mmap_mode="r")
+    _y = np.load(y_path, mmap_mode="r")
+    _folds = list(KFold(n_folds, shuffle=True, random_state=RANDOM_STATE).split(np.empty(len(_y))))
+
+
+def fit_fold(index, params, fold, export_dir=None):
+    """Fit one candidate on one fold; returns validation metrics"""
+    train_idx, val_idx = _folds[fold]
+    model = RandomForestRegressor(random_state=RANDOM_STATE, n_jobs=1, **params)
+    start = time.perf_counter()
+    model.fit(_X[train_idx], _y[train_idx])
+    fit_seconds = time.perf_counter() - start
+    y_pred = model.predict(_X[val_idx])
+    if export_dir is not None:
+        # Written for the parent to time; bundles need no encoders for that
+        save_bundle(export_dir, export_forest(model), {}, {"feature_names": []})
+    return index, fold, {
+        "mae": mean_absolute_error(_y[val_idx], y_pred),
+        "r2": r2_score(_y[val_idx], y_pred),
+        "fit_seconds": fit_seconds,
+    }
+
+
+def time_forest(forest, X):
+    """Median single-row and per-batch predict latency, in milliseconds"""
+    rows = X[:LATENCY_REPEATS]
+    single = []
+    for i in range(LATENCY_REPEATS):
+        row = rows[i % len(rows)][None, :]
+        start = time.perf_counter()
+        forest.predict(row)
+        single.append(time.perf_counter() - start)
+    batch = X[:LATENCY_BATCH_ROWS]
+    batched = []
+    for _ in range(10):
+        start = time.perf_counter()
+        forest.predict(batch)
+        batched.append(time.perf_counter() - start)
+    return float(np.median(single) * 1e3), float(np.median(batched) * 1e3)
+
+
+def select(results, mae_tolerance):
+    """Fastest candidate (then smallest) whose CV MAE is within tolerance of the best"""
+    best_mae = min(r["cv_mae"] for r in results)
+    eligible = [r for r in results if r["cv_mae"] <= best_mae * (1 + mae_tolerance)]
+    return min(eligible, key=lambda r: (r["latency_ms"], r["size_bytes"]))
+
+
+def search(X_train, y_train, store_dir, n_folds=5, workers=None, param_grid=PARAM_GRID, mae_tolerance=0.02):
+    """Cross-validate every candidate in param_grid; returns (selected params, report rows)"""
+    candidates = list(ParameterGrid(param_grid))
+    search_dir = os.path.join(store_dir, "search")
+    shutil.rmtree(search_dir, ignore_errors=True)
+    os.makedirs(search_dir)
+    x_path = os.path.join(search_dir, "X_train.npy")
+    y_path = os.path.join(search_dir, "y_train.npy")
+    np.save(x_path, np.ascontiguousarray(X_train, dtype=np.float32))
+    np.save(y_path, np.ascontiguousarray(y_train, dtype=np.float64))
+
+    workers = workers or os.cpu_count() or 1
+    print(f"Searching {len(candidates)} candidates x {n_folds} folds on {workers} worker processes...")
+    fold_metrics = [[None] * n_folds for _ in candidates]
+    start = time.perf_counter()
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(x_path, y_path, n_folds)) as pool:
+        futures = [
+            pool.submit(fit_fold, i, params, fold, os.path.join(search_dir, f"candidate_{i}") if fold == 0 else None)
+            for i, params in enumerate(candidates)
+            for fold in range(n_folds)
+        ]
+        for future in futures:
+            i, fold, metrics = future.result()
+            fold_metrics[i][fold] = metrics
+    print(f"Cross-validation finished in {time.perf_counter() - start:.1f}s")
+
+    # Timed here, one forest at a time, so pool contention doesn't skew latencies
+    X_timing = np.load(x_path, mmap_mode="r")[:max(LATENCY_REPEATS, LATENCY_BATCH_ROWS)]
+    X_timing = np.ascontiguousarray(X_timing)
+    results = []
+    for i, params in enumerate(candidates):
+        forest, _, _ = load_bundle(os.path.join(search_dir, f"candidate_{i}"), mmap=False)
+        latency_ms, batch_ms = time_forest(forest, X_timing)
+        maes = [m["mae"] for m in fold_metrics[i]]
+        results.append({
+            "params": params,
+            "cv_mae": float(np.mean(maes)),
+            "cv_mae_std": float(np.std(maes)),
+            "cv_r2": float(np.mean([m["r2"] for m in fold_metrics[i]])),
+            "fit_seconds": float(np.mean([m["fit_seconds"] for m in fold_metrics[i]])),
+            "latency_ms": latency_ms,
+            "batch_ms": batch_ms,
+            "size_bytes": int(forest.nbytes),
+        })
+
+    selected = select(results, mae_tolerance)
+    print_report(results, selected)
+    with open(os.path.join(search_dir, "report.json"), "w") as f:
+        json.dump({"selected": selected, "mae_tolerance": mae_tolerance, "candidates": results}, f, indent=2)
+    print(f"Search report written to {os.path.join(search_dir, 'report.json')}")
+    return selected["params"], results
+
+
+def print_report(results, selected):
+    print(f"\n{'n_est':>5} {'depth':>5} {'leaf':>4} {'CV MAE':>14} {'R²':>7} {'1-row ms':>8} {'256-row ms':>10} {'size KB':>8}")
+    for r in sorted(results, key=lambda r: r["cv_mae"]):
+        p = r["params"]
+        marker = " <- selected" if r is selected else ""
+        print(
+            f"{p['n_estimators']:>5} {str(p['max_depth']):>5} {p['min_samples_leaf']:>4} "
+            f"{r['cv_mae']:>14,.0f} {r['cv_r2']:>7.4f} {r['latency_ms']:>8.3f} {r['batch_ms']:>10.2f} "
+            f"{r['size_bytes'] / 1024:>8.0f}{marker}"
+        )
@@ -0,0 +1,65 @@
+import gzip
+import hashlib
+import json
+import os
+
+from fastapi import Request, Response
+
+# Bodies under this size are not worth gzipping
+GZIP_MIN_SIZE = 512
+
+
+class CachedPayload:
+    """A JSON body serialized once, with its gzip variant and content-hash ETag"""
+    __slots__ = ("body", "gzip_body", "etag")
+
+    def __init__(self, data):
+        self.body = json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        self.gzip_body = gzip.compress(self.body, mtime=0) if len(self.body) >= GZIP_MIN_SIZE else None
+        self.etag = f'W/"{hashlib.sha256(self.body).hexdigest()[:32]}"'
+
+    def matches(self, if_none_match):
+        if not if_none_match:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or any(tag.removeprefix("W/") == self.etag.removeprefix("W/") for tag in tags)
+
+    def response(self, request: Request) -> Response:
+        headers = {"ETag": self.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+        if self.matches(request.headers.get("if-none-match")):
+            return Response(status_code=304, headers=headers)
+        if self.gzip_body is not None and "gzip" in request.headers.get("accept-encoding", ""):
+            headers["Content-Encoding"] = "gzip"
+            return Response(content=self.gzip_body, media_type="application/json", headers=headers)
+        return Response(content=self.body, media_type="application/json", headers=headers)
+
+
+def load_neighborhood_map(map_path):
+    if not os.path.exists(map_path):
+        print(f"Backend: Mapping file NOT found at {map_path}")
+        return {}
+    with open(map_path, "r") as f:
+        mapping = json.load(f)
+    print(f"Backend: Mapping loaded successfully from {map_path}")
+    return mapping
+
+
+def build_options(encoder_tables, map_path):
+    """Return the /options payload and one payload per city"""
+    cities = []
+    types = []
+    if encoder_tables:
+        cities = sorted(encoder_tables['city'].classes)
+        types = sorted(encoder_tables['type'].classes)
+    mapping = load_neighborhood_map(map_path)
+
+    options = CachedPayload({
+        "cities": cities,
+        "types": types,
+        "neighborhood_mapping": mapping,
+    })
+    by_city = {
+        city: CachedPayload({"city": city, "neighborhoods": mapping.get(city, [])})
+        for city in set(cities) | set(mapping)
+    }
+    return options, by_city
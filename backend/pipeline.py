@@ -0,0 +1,244 @@
+"""Staged, cached build of the model artifacts.
+
+    load --> clean --> encode --> fit --> save
+      \\                                  /
+       `--> mapping ---------------------'
+
+One read of the CSV (load) feeds both the encoders and
+city_neighborhood_map.json. Every stage except save caches its output
+under ``<cache_dir>/<stage>-<key>.joblib``. The key hashes what the
+output depends on:
+
+- the upstream stages' keys
+- the stage's parameters
+- the source code of the functions it runs
+- for load, the content of the dataset file
+
+A key is therefore known before anything runs. A stage is only
+computed, or read back, when something downstream actually needs its
+output. A retrain that changes only forest hyperparameters reads the
+cached encode output and refits; it never re-parses the CSV. Changing
+the cleaning code invalidates clean and everything after it.
+
+save always runs. It writes the pickles and city_neighborhood_map.json,
+and publishes the model to the registry with the map inside the version
+(see train_model.save_artifacts), so a rollback also rolls back /options.
+When fit and mapping came from the cache, the content matches the newest
+registry version and no new version is created.
+Timings are printed per stage, with the cached ones marked.
+
+    python train_model.py --data listings.csv --n-estimators 200
+    python generate_mapping.py --data listings.csv
+"""
+import hashlib
+import inspect
+import json
+import os
+import time
+
+import joblib
+
+from size_parser import parse_size, parse_size_column
+
+MAP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "city_neighborhood_map.json")
+DROP_COLUMNS = ["url", "date"]
+# Cached outputs kept per stage; older ones are deleted after a build
+KEEP_PER_STAGE = 3
+# (path, size, mtime) -> content hash, so an unchanged dataset isn't re-hashed on every run
+DIGEST_MEMO_NAME = "digests.json"
+
+
+def file_digest(path, memo_path=None):
+    """sha256 of a file's content, remembered by (path, size, mtime) in memo_path"""
+    stat = os.stat(path)
+    memo_key = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    memo = {}
+    if memo_path and os.path.exists(memo_path):
+        with open(memo_path) as f:
+            memo = json.load(f)
+    if memo_key not in memo:
+        with open(path, "rb") as f:
+            memo[memo_key] = hashlib.file_digest(f, "sha256").hexdigest()
+        if memo_path:
+            write_json(memo_path, memo)
+    return memo[memo_key]
+
+
+def write_json(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def source_digest(functions):
+    digest = hashlib.sha256()
+    for func in functions:
+        digest.update(inspect.getsource(func).encode())
+    return digest.hexdigest()
+
+
+class Pipeline:
+    """Named stages, each func(*upstream outputs, **params, **options), cached under a content key"""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.stages = {}
+        self.report = {}
+        self._keys = {}
+        self._outputs = {}
+
+    def add(self, name, func, deps=(), params=None, options=None, code=(), cache=True, fingerprint=None):
+        """Register a stage.
+
+        ``params`` are part of the key; ``options`` (paths, worker counts) are
+        passed along but are not. ``code`` lists functions or modules, beyond
+        func itself, whose source is part of the key. ``fingerprint`` stands
+        in for inputs that aren't stages, such as the dataset's content hash.
+        """
+        self.stages[name] = {
+            "func": func, "deps": tuple(deps), "params": params or {}, "options": options or {},
+            "code": (func, *code), "cache": cache, "fingerprint": fingerprint,
+        }
+
+    def key(self, name):
+        if name not in self._keys:
+            stage = self.stages[name]
+            payload = json.dumps({
+                "stage": name,
+                "deps": [self.key(dep) for dep in stage["deps"]],
+                "params": stage["params"],
+                "code": source_digest(stage["code"]),
+                "fingerprint": stage["fingerprint"],
+            }, sort_keys=True, default=str)
+            self._keys[name] = hashlib.sha256(payload.encode()).hexdigest()[:16]
+        return self._keys[name]
+
+    def path(self, name):
+        return os.path.join(self.cache_dir, f"{name}-{self.key(name)}.joblib")
+
+    def get(self, name):
+        """The stage's output: from memory, else from the cache, else by running it"""
+        if name in self._outputs:
+            return self._outputs[name]
+        stage = self.stages[name]
+        path = self.path(name)
+        if stage["cache"] and os.path.exists(path):
+            start = time.perf_counter()
+            output = joblib.load(path)
+            self._record(name, time.perf_counter() - start, cached=True)
+        else:
+            inputs = [self.get(dep) for dep in stage["deps"]]
+            start = time.perf_counter()
+            output = stage["func"](*inputs, **stage["params"], **stage["options"])
+            elapsed = time.perf_counter() - start
+            if stage["cache"]:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                joblib.dump(output, path + ".tmp")
+                os.replace(path + ".tmp", path)
+            self._record(name, elapsed, cached=False)
+        self._outputs[name] = output
+        return output
+
+    def prune(self, keep=KEEP_PER_STAGE):
+        """Delete all but the newest ``keep`` cached outputs of each stage"""
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in self.stages:
+            entries = sorted(
+                (os.path.join(self.cache_dir, f) for f in os.listdir(self.cache_dir)
+                 if f.startswith(name + "-") and f.endswith(".joblib")),
+                key=os.path.getmtime, reverse=True,
+            )
+            for stale in entries[keep:]:
+                os.remove(stale)
+
+    def _record(self, name, seconds, cached):
+        self.report[name] = {"seconds": seconds, "cached": cached}
+        print(f"[{name}] {seconds:.2f}s{' (cached)' if cached else ''}")
+
+
+def load_listings(path):
+    """The dataset without the columns no stage uses"""
+    from train_model import load_and_explore_data
+
+    df = load_and_explore_data(path)
+    return df.drop(columns=[c for c in DROP_COLUMNS if c in df.columns])
+
+
+def build_mapping(df):
+    """Neighborhoods by city, from every listing (valid price or not), for /options"""
+    cities = df['city'].astype(str).str.strip()
+    neighborhoods = df['neighborhood'].astype(str).str.strip()
+    mapping = {}
+    for city, group in neighborhoods.groupby(cities):
+        mapping[city] = sorted(str(x) for x in group.unique() if str(x).lower() != 'nan')
+    return mapping
+
+
+def encode(cleaned):
+    from train_model import encode_data
+
+    return encode_data(*cleaned)
+
+
+def fit(encoded, params=None, search=False, folds=5, workers=None, store_dir="backend/training_store"):
+    from train_model import train_model
+
+    X, y, _, _ = encoded
+    return train_model(X, y, search=search, folds=folds, workers=workers, store_dir=store_dir, params=params)
+
+
+def save(fitted, encoded, mapping, map_path=MAP_PATH):
+    from train_model import save_artifacts
+
+    model, feature_names = fitted
+    _, _, label_encoders, target_col = encoded
+    save_artifacts(model, label_encoders, feature_names, target_col, mapping)
+    write_json(map_path, mapping)
+    print(f"Mapping saved to {map_path}")
+
+
+def build_pipeline(data_path, cache_dir, params=None, search=False, folds=5, workers=None,
+                   store_dir="backend/training_store", map_path=MAP_PATH):
+    import train_model
+
+    os.makedirs(cache_dir, exist_ok=True)
+    pipeline = Pipeline(cache_dir)
+    pipeline.add(
+        "load", load_listings, options={"path": data_path}, code=(train_model.load_and_explore_data,),
+        fingerprint=file_digest(data_path, os.path.join(cache_dir, DIGEST_MEMO_NAME)),
+    )
+    pipeline.add("clean", train_model.clean_data, deps=["load"], code=(parse_size, parse_size_column))
+    pipeline.add("encode", encode, deps=["clean"], code=(train_model.encode_data,))
+    pipeline.add("mapping", build_mapping, deps=["load"])
+    fit_code = (train_model.train_model,)
+    if search:
+        import model_search
+
+        fit_code += (model_search,)
+    # workers changes how fast the search runs, not its result, so it is not part of the key
+    pipeline.add(
+        "fit", fit, deps=["encode"], code=fit_code,
+        params={"params": params or {}, "search": search, "folds": folds if search else None},
+        options={"workers": workers, "store_dir": store_dir},
+    )
+    pipeline.add(
+        "save", save, deps=["fit", "encode", "mapping"], options={"map_path": map_path},
+        code=(train_model.save_artifacts,), cache=False,
+    )
+    return pipeline
+
+
+def build_artifacts(data_path, cache_dir, **options):
+    """Run the full pipeline; returns {stage: {"seconds", "cached"}}"""
+    pipeline = build_pipeline(data_path, cache_dir, **options)
+    start = time.perf_counter()
+    pipeline.get("save")
+    pipeline.prune()
+    total = time.perf_counter() - start
+    print(f"\n{'stage':<10}{'seconds':>10}  source")
+    for name, entry in pipeline.report.items():
+        print(f"{name:<10}{entry['seconds']:>10.2f}  {'cache' if entry['cached'] else 'ran'}")
+    print(f"{'total':<10}{total:>10.2f}")
+    return pipeline.report
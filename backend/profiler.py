@@ -0,0 +1,94 @@
+import os
+import sys
+import threading
+from datetime import datetime
+
+
+class SlowRequestProfiler:
+    """Opt-in sampling profiler for slow requests.
+
+    While enabled, a background thread samples the stack of every thread
+    that is inside a request phase (see metrics.phase) every ``interval``
+    seconds, and tallies the stacks on that request's trace. When a
+    request takes longer than ``threshold_ms``, its stacks are written to
+    ``output_dir`` in folded format ("root;caller;callee count" per line),
+    which flamegraph.pl, speedscope and inferno read directly.
+
+    Sampling uses sys._current_frames(), so nothing is instrumented and
+    the cost while disabled is one attribute check per request.
+    """
+
+    def __init__(self, enabled=False, threshold_ms=500.0, interval=0.005, output_dir="profiles", max_dumps=1000):
+        self.threshold_ms = threshold_ms
+        self.interval = interval
+        self.output_dir = output_dir
+        self.max_dumps = max_dumps
+        self.dumps = 0
+        self._active = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.enabled = False
+        if enabled:
+            self.enable()
+
+    def enable(self, threshold_ms=None):
+        if threshold_ms is not None:
+            self.threshold_ms = threshold_ms
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+            self._thread.start()
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            self._active.clear()
+
+    def attach(self, trace, phase):
+        with self._lock:
+            self._active[threading.get_ident()] = (trace, phase)
+
+    def detach(self):
+        with self._lock:
+            self._active.pop(threading.get_ident(), None)
+
+    def finish(self, trace, route, elapsed):
+        if elapsed * 1000 < self.threshold_ms or not trace.samples or self.dumps >= self.max_dumps:
+            return
+        os.makedirs(self.output_dir, exist_ok=True)
+        name = f"{datetime.utcnow():%Y%m%d-%H%M%S-%f}-{route.replace(' ', '_').replace('/', '_')}-{elapsed * 1000:.0f}ms.folded"
+        with open(os.path.join(self.output_dir, name), "w") as f:
+            for stack, count in trace.samples.most_common():
+                f.write(f"{route};{stack} {count}\n")
+        self.dumps += 1
+
+    def stats(self):
+        return {"enabled": self.enabled, "threshold_ms": self.threshold_ms, "dumps": self.dumps}
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                active = list(self._active.items())
+            if not active:
+                continue
+            frames = sys._current_frames()
+            for thread_id, (trace, phase) in active:
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    trace.samples[phase + ";" + fold_stack(frame)] += 1
+
+
+def fold_stack(frame):
+    """'outermost;...;innermost' with one file:function entry per frame"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
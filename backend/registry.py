@@ -0,0 +1,149 @@
+import argparse
+import json
+import os
+import shutil
+from datetime import datetime
+
+from artifacts import bundle_exists, content_digest, read_manifest, save_bundle
+
+# A registry is a directory of bundles, one per model version, plus a
+# CURRENT file naming the version to serve:
+#
+#   registry/
+#     20250101-120000/   <- bundle (see artifacts.py)
+#     20250102-093000/
+#     CURRENT            <- "20250102-093000"
+#
+# Published versions are never modified. Deploying or rolling back is a
+# rewrite of CURRENT, which os.replace makes atomic, so a reader sees
+# either the old version or the new one.
+#
+# Publishing a model identical to the newest version (a retrain whose fit
+# came from the pipeline cache) reuses that version. After each publish
+# only the newest MODEL_REGISTRY_KEEP versions are kept, plus whichever
+# one CURRENT names; 0 keeps everything.
+CURRENT_NAME = "CURRENT"
+MODEL_REGISTRY_KEEP = int(os.environ.get("MODEL_REGISTRY_KEEP", 10))
+
+
+def version_dir(registry_dir, version):
+    return os.path.join(registry_dir, version)
+
+
+def list_versions(registry_dir):
+    """Published versions, oldest first"""
+    if not os.path.isdir(registry_dir):
+        return []
+    return sorted(
+        name for name in os.listdir(registry_dir)
+        if not name.endswith((".tmp", ".old")) and bundle_exists(version_dir(registry_dir, name))
+    )
+
+
+def current_version(registry_dir):
+    """The version CURRENT points at, or None for an empty registry"""
+    try:
+        with open(os.path.join(registry_dir, CURRENT_NAME)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def set_current(registry_dir, version):
+    if not bundle_exists(version_dir(registry_dir, version)):
+        raise ValueError(f"Unknown model version: '{version}'")
+    tmp_path = os.path.join(registry_dir, CURRENT_NAME + ".tmp")
+    with open(tmp_path, "w") as f:
+        f.write(version + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(registry_dir, CURRENT_NAME))
+
+
+def new_version(registry_dir):
+    """Timestamp version names, so they sort in publish order"""
+    base = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+    versions = list_versions(registry_dir)
+    # After the newest even when pruning has freed an older name in this second
+    newest = versions[-1] if versions else ""
+    version, n = base, 1
+    while version <= newest or os.path.exists(version_dir(registry_dir, version)):
+        n += 1
+        version = f"{base}-{n}"
+    return version
+
+
+def prune(registry_dir, keep=MODEL_REGISTRY_KEEP):
+    """Delete all but the newest ``keep`` versions, never the current one; returns the deleted versions"""
+    if keep <= 0:
+        return []
+    current = current_version(registry_dir)
+    stale = [v for v in list_versions(registry_dir)[:-keep] if v != current]
+    for version in stale:
+        # Workers still serving it keep their memory maps; unlinked files live until they are unmapped
+        shutil.rmtree(version_dir(registry_dir, version))
+    return stale
+
+
+def publish(registry_dir, forest, label_encoders, metadata, mapping=None, activate=True, keep=MODEL_REGISTRY_KEEP):
+    """Write a new version and (by default) make it current; returns the version.
+
+    ``mapping`` is the neighborhood map to serve with this version. When
+    the newest version already holds the same content, it is reused
+    instead of writing a copy.
+    """
+    os.makedirs(registry_dir, exist_ok=True)
+    versions = list_versions(registry_dir)
+    digest = content_digest(forest, label_encoders, metadata, mapping)
+    if versions and read_manifest(version_dir(registry_dir, versions[-1])).get("content_digest") == digest:
+        version = versions[-1]
+    else:
+        version = new_version(registry_dir)
+        save_bundle(version_dir(registry_dir, version), forest, label_encoders, metadata, mapping)
+    if activate:
+        set_current(registry_dir, version)
+    prune(registry_dir, keep)
+    return version
+
+
+if __name__ == "__main__":
+    models_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+    parser = argparse.ArgumentParser(description="Manage the versioned model registry")
+    parser.add_argument("--registry", default=os.environ.get("MODEL_REGISTRY_DIR", os.path.join(models_dir, "registry")))
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="List published versions")
+    publish_cmd = commands.add_parser("publish", help="Publish the joblib pickles in models/ as a new version")
+    publish_cmd.add_argument("--no-activate", action="store_true", help="Publish without making it current")
+    activate_cmd = commands.add_parser("activate", help="Serve an already published version (deploy or roll back)")
+    activate_cmd.add_argument("version")
+    prune_cmd = commands.add_parser("prune", help="Delete old versions (never the current one)")
+    prune_cmd.add_argument("--keep", type=int, default=MODEL_REGISTRY_KEEP)
+    args = parser.parse_args()
+
+    if args.command == "list":
+        current = current_version(args.registry)
+        for version in list_versions(args.registry):
+            print(("* " if version == current else "  ") + version)
+    elif args.command == "publish":
+        import joblib
+        from forest import export_forest
+
+        model = joblib.load(os.path.join(models_dir, "model.pkl"))
+        label_encoders = joblib.load(os.path.join(models_dir, "label_encoders.pkl"))
+        metadata = joblib.load(os.path.join(models_dir, "metadata.pkl"))
+        # The map generate_mapping.py / train_model.py wrote next to these pickles
+        map_path = os.path.join(os.path.dirname(models_dir), "city_neighborhood_map.json")
+        mapping = None
+        if os.path.exists(map_path):
+            with open(map_path) as f:
+                mapping = json.load(f)
+        version = publish(
+            args.registry, export_forest(model), label_encoders, metadata, mapping, activate=not args.no_activate
+        )
+        print(f"Published model version {version}")
+    elif args.command == "prune":
+        for version in prune(args.registry, args.keep):
+            print(f"Deleted model version {version}")
+    else:
+        set_current(args.registry, args.version)
+        print(f"Now serving model version {args.version}")
@@ -0,0 +1,132 @@
+import threading
+
+from encoders import compile_classes
+from options import build_options
+
+
+class ServingModel:
+    """Everything predictions need from one artifact version.
+
+    Built completely before it is published, and never mutated after, so a
+    request that reads ``reloader.current`` once sees a consistent model,
+    encoders, feature order and options for its whole lifetime.
+    """
+    __slots__ = ("version", "model", "encoder_tables", "feature_names", "options", "city_options")
+
+    def __init__(self, version, model, encoder_classes, feature_names, map_path):
+        self.version = version
+        self.model = model
+        self.encoder_tables = compile_classes(encoder_classes)
+        self.feature_names = list(feature_names)
+        self.options, self.city_options = build_options(self.encoder_tables, map_path)
+
+
+class ModelReloader:
+    """Holds the ServingModel being served and replaces it without a restart.
+
+    load() builds the new ServingModel on the calling thread (a worker
+    thread, never the event loop) while the old one keeps serving, then
+    swaps the single ``current`` reference. Loads are serialized, and a
+    failed load leaves the old model in place.
+
+    With a ``fingerprint`` callable and ``watch_interval`` > 0, a watcher
+    thread polls the fingerprint (e.g. the registry's CURRENT version) and
+    reloads when it changes.
+    """
+
+    def __init__(self, loader, fingerprint=None, watch_interval=0, on_swap=None):
+        self.loader = loader
+        self.fingerprint = fingerprint
+        self.watch_interval = watch_interval
+        self.on_swap = on_swap
+        self.current = None
+        self.reloads = 0
+        self.failed_reloads = 0
+        self.last_error = None
+        self._loaded_fingerprint = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def load(self, version=None, publish=None):
+        """Build the current artifacts and swap them in; returns the new ServingModel.
+
+        With ``version``, the loader builds that version instead of the
+        current one, and ``publish(version)`` (e.g. rewriting the registry's
+        CURRENT) runs only once it has loaded, so a broken version is never
+        published. Both happen under the load lock, so the watcher can't
+        reload the old version in between.
+        """
+        with self._lock:
+            fingerprint = self.fingerprint() if self.fingerprint else None
+            try:
+                if version is None:
+                    serving = self.loader()
+                else:
+                    serving = self.loader(version)
+                    if publish:
+                        publish(version)
+                    fingerprint = version
+            except Exception as e:
+                self.failed_reloads += 1
+                self.last_error = str(e)
+                raise
+            previous, self.current = self.current, serving
+            self._loaded_fingerprint = fingerprint
+            self.reloads += 1
+            self.last_error = None
+        if self.on_swap:
+            self.on_swap(previous, serving)
+        return serving
+
+    def load_in_background(self):
+        """Start the first load on its own thread, then start the watcher; returns immediately"""
+        def run():
+            try:
+                serving = self.load()
+                print(f"Backend: Model {serving.version} loaded.")
+            except Exception as e:
+                print(f"Backend: Model load failed ({e})")
+            # Started even after a failure, so a fixed CURRENT is picked up without a restart
+            self.start_watch()
+
+        threading.Thread(target=run, name="model-loader", daemon=True).start()
+
+    @property
+    def watching(self):
+        return self._thread is not None
+
+    def changed(self):
+        return self.fingerprint is not None and self.fingerprint() != self._loaded_fingerprint
+
+    def start_watch(self):
+        if self.fingerprint is None or self.watch_interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="model-watcher", daemon=True)
+        self._thread.start()
+
+    def stop_watch(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        return {
+            "version": self.current.version if self.current else None,
+            "reloads": self.reloads,
+            "failed_reloads": self.failed_reloads,
+            "last_error": self.last_error,
+            "watching": self.watching,
+        }
+
+    def _watch(self):
+        while not self._stop.wait(self.watch_interval):
+            try:
+                if self.changed():
+                    serving = self.load()
+                    print(f"Backend: Hot-reloaded model version {serving.version}")
+            except Exception as e:
+                # Keep serving the old model; the next poll retries
+                print(f"Backend: Model reload failed ({e})")
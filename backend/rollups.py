@@ -0,0 +1,272 @@
+"""Incrementally maintained aggregates of predicted prices.
+
+One prediction_rollups row per (city, neighborhood, property type, UTC
+day) holds the count, sum, min and max of the predicted prices, plus a
+QuantileSketch of them. apply_rollups folds a batch of new predictions
+into those rows inside the transaction that inserts the batch (the
+HistoryWriter flush and the synchronous fallback), so the rollups always
+agree with the history. /analytics then reads at most one row per cell
+in the requested range, however many predictions there are.
+
+Rebuild the table from the existing history (after first deploying it,
+or after rows were inserted some other way) with:
+
+    python rollups.py backfill
+"""
+import argparse
+import json
+import math
+import time
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import insert, text
+from sqlalchemy.exc import IntegrityError
+
+from database import Prediction, PredictionRollup, SessionLocal, init_db
+
+SKETCH_RELATIVE_ACCURACY = 0.01
+_GAMMA = (1 + SKETCH_RELATIVE_ACCURACY) / (1 - SKETCH_RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+BACKFILL_BATCH_ROWS = 50000
+# Times apply_rollups re-reads cells after another writer created some of them first
+NEW_CELL_RETRIES = 3
+# Public group names -> PredictionRollup columns
+GROUP_COLUMNS = {"day": "day", "city": "city", "neighborhood": "neighborhood", "type": "property_type"}
+
+
+class QuantileSketch:
+    """Log-bucketed histogram (the DDSketch mapping) with bounded relative error.
+
+    A value x is counted in bucket ceil(log_gamma(x)), and a quantile is
+    answered with its bucket's representative value, which is within
+    SKETCH_RELATIVE_ACCURACY of the true quantile. Sketches merge by
+    adding bucket counts, so daily cells combine into any range or
+    grouping exactly as if the sketch were built from all of the values.
+    Prices span a few decades, so a sketch never holds more than about a
+    thousand buckets.
+    """
+    __slots__ = ("buckets",)
+
+    def __init__(self, buckets=None):
+        self.buckets = Counter(buckets or {})
+
+    def add(self, value):
+        # Prices below 1 aren't expected; they are counted as 1
+        self.buckets[math.ceil(math.log(max(value, 1.0)) / _LOG_GAMMA)] += 1
+
+    def merge(self, other):
+        self.buckets.update(other.buckets)
+
+    def quantile(self, q):
+        total = sum(self.buckets.values())
+        if not total:
+            return None
+        rank = q * (total - 1)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                break
+        # The point of (gamma^(i-1), gamma^i] with equal relative error to both ends
+        return 2 * _GAMMA ** index / (_GAMMA + 1)
+
+    def to_json(self):
+        return json.dumps({str(i): n for i, n in sorted(self.buckets.items())}, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, data):
+        return cls({int(i): n for i, n in json.loads(data).items()})
+
+
+class Rollup:
+    """count/sum/min/max/sketch of a set of prices; mergeable like the sketch"""
+    __slots__ = ("count", "total", "min_price", "max_price", "sketch")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min_price = math.inf
+        self.max_price = -math.inf
+        self.sketch = QuantileSketch()
+
+    @classmethod
+    def from_row(cls, row):
+        rollup = cls()
+        rollup.count = row.count
+        rollup.total = row.total
+        rollup.min_price = row.min_price
+        rollup.max_price = row.max_price
+        rollup.sketch = QuantileSketch.from_json(row.sketch)
+        return rollup
+
+    def add(self, price):
+        self.count += 1
+        self.total += price
+        self.min_price = min(self.min_price, price)
+        self.max_price = max(self.max_price, price)
+        self.sketch.add(price)
+
+    def merge(self, other):
+        self.count += other.count
+        self.total += other.total
+        self.min_price = min(self.min_price, other.min_price)
+        self.max_price = max(self.max_price, other.max_price)
+        self.sketch.merge(other.sketch)
+
+    def columns(self):
+        return {
+            "count": self.count, "total": self.total, "min_price": self.min_price,
+            "max_price": self.max_price, "sketch": self.sketch.to_json(),
+        }
+
+    def summary(self, quantiles=(0.5, 0.9)):
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "min": self.min_price if self.count else None,
+            "max": self.max_price if self.count else None,
+            "quantiles": {f"p{q * 100:g}": self.sketch.quantile(q) for q in quantiles},
+        }
+
+
+def cell_key(city, neighborhood, property_type, timestamp):
+    # Primary key columns can't be NULL; the predictions columns can
+    return (city or "", neighborhood or "", property_type or "", timestamp.date())
+
+
+def rollup_rows(rows):
+    """Aggregate Prediction row dicts by cell"""
+    cells = {}
+    for row in rows:
+        if row.get("predicted_price") is None:
+            continue
+        key = cell_key(row.get("city"), row.get("neighborhood"), row.get("property_type"),
+                       row.get("timestamp") or datetime.utcnow())
+        cell = cells.get(key)
+        if cell is None:
+            cell = cells[key] = Rollup()
+        cell.add(row["predicted_price"])
+    return cells
+
+
+def apply_rollups(db, rows):
+    """Fold new prediction rows into their rollup cells; the caller commits.
+
+    Call it after the rows' INSERT in the same transaction. On SQLite the
+    INSERT has already taken the write lock, and on PostgreSQL the cells
+    are read FOR UPDATE, so concurrent writers (other workers' flushes)
+    can't lose each other's updates. New cells are inserted in a
+    savepoint: when another writer (PostgreSQL only) committed the same
+    cell first, the primary key fails, and the cells are read again and
+    merged into instead of failing the caller's transaction.
+    """
+    cells = rollup_rows(rows)
+    for attempt in range(NEW_CELL_RETRIES + 1):
+        if not cells:
+            return
+        # A superset of the cells we need (every city x day pair); the extra rows are ignored
+        candidates = db.query(PredictionRollup).filter(
+            PredictionRollup.day.in_({key[3] for key in cells}),
+            PredictionRollup.city.in_({key[0] for key in cells}),
+        ).with_for_update()
+        existing = {(r.city, r.neighborhood, r.property_type, r.day): r for r in candidates}
+        new_cells = {}
+        for key, cell in cells.items():
+            row = existing.get(key)
+            if row is None:
+                new_cells[key] = cell
+            else:
+                merged = Rollup.from_row(row)
+                merged.merge(cell)
+                for name, value in merged.columns().items():
+                    setattr(row, name, value)
+        if not new_cells:
+            return
+        try:
+            with db.begin_nested():
+                db.add_all(
+                    PredictionRollup(city=city, neighborhood=neighborhood, property_type=property_type, day=day,
+                                     **cell.columns())
+                    for (city, neighborhood, property_type, day), cell in new_cells.items()
+                )
+            return
+        except IntegrityError:
+            if attempt == NEW_CELL_RETRIES:
+                raise
+            # The merges above are kept; only the inserts rolled back. Those cells exist now.
+            cells = new_cells
+
+
+def query_rollups(db, start, end, group_by=("day",), city=None, neighborhood=None, property_type=None):
+    """Merged Rollups for the cells in [start, end], by the GROUP_COLUMNS named in group_by"""
+    query = db.query(PredictionRollup).filter(PredictionRollup.day >= start, PredictionRollup.day <= end)
+    if city is not None:
+        query = query.filter(PredictionRollup.city == city)
+    if neighborhood is not None:
+        query = query.filter(PredictionRollup.neighborhood == neighborhood)
+    if property_type is not None:
+        query = query.filter(PredictionRollup.property_type == property_type)
+    groups = {}
+    for row in query:
+        key = tuple(getattr(row, GROUP_COLUMNS[name]) for name in group_by)
+        if key not in groups:
+            groups[key] = Rollup()
+        groups[key].merge(Rollup.from_row(row))
+    return sorted(groups.items())
+
+
+def backfill(session_factory=SessionLocal, batch_rows=BACKFILL_BATCH_ROWS):
+    """Rebuild every rollup from the predictions table in one transaction; returns (predictions, cells)"""
+    db = session_factory()
+    try:
+        # Deleting first takes SQLite's write lock, and PostgreSQL gets an explicit lock, so no
+        # flush can commit predictions between the scan and the commit and be counted twice or not at all
+        if db.bind.dialect.name == "postgresql":
+            db.execute(text("LOCK TABLE predictions IN SHARE MODE"))
+        db.query(PredictionRollup).delete()
+        cells = {}
+        scanned = 0
+        last_id = 0
+        while True:
+            batch = db.query(
+                Prediction.id, Prediction.city, Prediction.neighborhood, Prediction.property_type,
+                Prediction.predicted_price, Prediction.timestamp,
+            ).filter(Prediction.id > last_id).order_by(Prediction.id).limit(batch_rows).all()
+            if not batch:
+                break
+            for p in batch:
+                if p.predicted_price is None or p.timestamp is None:
+                    continue
+                key = cell_key(p.city, p.neighborhood, p.property_type, p.timestamp)
+                cell = cells.get(key)
+                if cell is None:
+                    cell = cells[key] = Rollup()
+                cell.add(p.predicted_price)
+            scanned += len(batch)
+            last_id = batch[-1].id
+        if cells:
+            db.execute(insert(PredictionRollup), [
+                {"city": city, "neighborhood": neighborhood, "property_type": property_type, "day": day, **cell.columns()}
+                for (city, neighborhood, property_type, day), cell in cells.items()
+            ])
+        db.commit()
+        return scanned, len(cells)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the prediction_rollups table")
+    commands = parser.add_subparsers(dest="command", required=True)
+    backfill_cmd = commands.add_parser("backfill", help="Rebuild all rollups from the predictions table")
+    backfill_cmd.add_argument("--batch-rows", type=int, default=BACKFILL_BATCH_ROWS)
+    args = parser.parse_args()
+
+    init_db()
+    start = time.perf_counter()
+    scanned, n_cells = backfill(batch_rows=args.batch_rows)
+    print(f"Backfilled {n_cells} rollup cells from {scanned} predictions in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,49 @@
+"""Parsing of the listing 'size' field ("1200 sqft", "799-1258 sqft", ...).
+
+Shared by training (whole columns) and serving (one value per request) so
+both see exactly the same numbers:
+
+- the text is lower-cased, 'sqft' is removed and whitespace is stripped
+- "a-b" is a range and parses to its midpoint; anything after a second
+  '-' is ignored
+- anything else must be a plain number
+- empty, missing, non-string or unparseable values become 0 (dropped in
+  training)
+"""
+
+
+def parse_size(size_str) -> float:
+    if not isinstance(size_str, str):
+        return 0
+    try:
+        # Remove 'sqft' and whitespace
+        size_str = size_str.lower().replace('sqft', '').strip()
+        if not size_str:
+            return 0
+        # Handle ranges (e.g., "799-1258")
+        if '-' in size_str:
+            parts = size_str.split('-')
+            val1 = float(parts[0].strip())
+            val2 = float(parts[1].strip())
+            return (val1 + val2) / 2
+        return float(size_str)
+    except ValueError:
+        return 0
+
+
+def parse_size_column(sizes):
+    """parse_size over a whole column.
+
+    Listings repeat a few thousand distinct size strings, so each distinct
+    value is parsed once and the results are gathered back by code. This
+    is several times faster than Series.apply and gives identical values.
+    Serving only needs parse_size, so pandas is imported here rather than
+    at module level.
+    """
+    import numpy as np
+    import pandas as pd
+
+    codes, uniques = pd.factorize(sizes)
+    # Missing values get code -1, which picks the trailing 0
+    parsed = np.array([parse_size(v) for v in uniques] + [0], dtype=np.float64)
+    return pd.Series(parsed[codes], index=sizes.index, name=sizes.name)
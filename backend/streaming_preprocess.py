@@ -0,0 +1,240 @@
+"""Chunked version of train_model.preprocess_data for CSVs larger than RAM.
+
+Produces the same cleaned, filled and label-encoded training set as
+preprocess_data, but reads the CSV in fixed-size chunks over four passes:
+
+1. scan     - schema, row/missing counts, and a histogram of valid prices
+2. quantile - the exact 95th-percentile price, from the histogram bins
+              that hold it
+3. stats    - value counts per column on the kept rows, which give the
+              medians, modes and category vocabularies
+4. encode   - fill, encode and write rows into a float32 .npy matrix that
+              is memory-mapped on disk
+
+Only value counts, the histogram and one chunk are in memory at a time.
+Categorical columns are read as pandas categoricals, numeric columns as
+float32, and url/date are never read. Peak traced memory is reported for
+each stage.
+"""
+import os
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import LabelEncoder
+
+from size_parser import parse_size_column
+
+DROP_COLUMNS = ['url', 'date']
+MIN_PRICE = 100000
+PRICE_QUANTILE = 0.95
+# Log-spaced price bins from 1e5 to 1e15; anything above lands in the last bin
+PRICE_BIN_EDGES = np.logspace(5, 15, (1 << 20) + 1)
+
+
+@contextmanager
+def stage(name, report):
+    """Time a stage and record its peak traced memory"""
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _, peak = tracemalloc.get_traced_memory()
+        elapsed = time.perf_counter() - start
+        if started_tracing:
+            tracemalloc.stop()
+        report[name] = {"seconds": elapsed, "peak_mb": peak / 1e6}
+        print(f"[{name}] {elapsed:.2f}s, peak memory {peak / 1e6:.1f} MB")
+
+
+def find_target_column(columns):
+    for col in columns:
+        if 'price' in col.lower():
+            return col
+    print("Warning: Could not find price column. Using last column as target.")
+    return columns[-1]
+
+
+def price_bins(prices):
+    return np.clip(np.searchsorted(PRICE_BIN_EDGES, prices, side='right') - 1, 0, len(PRICE_BIN_EDGES) - 2)
+
+
+def lerp(a, b, t):
+    # Same formula numpy (and so pandas) uses for linear quantile interpolation
+    diff = b - a
+    return b - diff * (1 - t) if t >= 0.5 else a + diff * t
+
+
+def median_from_counts(counts):
+    total = sum(counts.values())
+    if total == 0:
+        return np.nan
+    middle = [(total - 1) // 2, total // 2]
+    values = []
+    seen = 0
+    for value in sorted(counts):
+        seen += counts[value]
+        while middle and middle[0] < seen:
+            values.append(value)
+            middle.pop(0)
+    return (values[0] + values[1]) / 2
+
+
+def mode_from_counts(counts):
+    if not counts:
+        return 'Unknown'
+    top = max(counts.values())
+    return min(value for value, count in counts.items() if count == top)
+
+
+class StreamingPreprocessor:
+    def __init__(self, path, chunksize=100000, store_dir="backend/training_store"):
+        self.path = path
+        self.chunksize = chunksize
+        self.store_dir = store_dir
+        self.report = {}
+
+    def chunks(self, dtype=None):
+        return pd.read_csv(self.path, chunksize=self.chunksize, usecols=self.columns, dtype=dtype)
+
+    def clean(self, chunk):
+        """Parse size and apply the price/size validity filters from preprocess_data"""
+        if 'size' in chunk.columns:
+            chunk['size'] = parse_size_column(chunk['size'])
+        keep = chunk[self.target_col] >= MIN_PRICE
+        if 'size' in chunk.columns:
+            keep &= chunk['size'] > 0
+        return chunk[keep]
+
+    def scan(self):
+        header = pd.read_csv(self.path, nrows=0).columns.tolist()
+        self.columns = [c for c in header if c not in DROP_COLUMNS]
+        print("\nColumns after dropping irrelevant ones:", self.columns)
+        self.target_col = find_target_column(self.columns)
+        print(f"Using '{self.target_col}' as target column")
+        self.feature_names = [c for c in self.columns if c != self.target_col]
+
+        self.total_rows = 0
+        self.valid_rows = 0
+        missing = Counter()
+        categorical = set()
+        self.price_hist = np.zeros(len(PRICE_BIN_EDGES) - 1, dtype=np.int64)
+        for chunk in self.chunks():
+            self.total_rows += len(chunk)
+            missing.update(chunk.isnull().sum().to_dict())
+            categorical.update(c for c in self.feature_names if not pd.api.types.is_numeric_dtype(chunk[c]))
+            prices = self.clean(chunk)[self.target_col].to_numpy(dtype=np.float64)
+            self.valid_rows += len(prices)
+            self.price_hist += np.bincount(price_bins(prices), minlength=len(self.price_hist))
+
+        # 'size' is parsed to a number, so it is never categorical
+        self.categorical_cols = [c for c in self.feature_names if c in categorical and c != 'size']
+        self.numeric_cols = [c for c in self.feature_names if c not in self.categorical_cols]
+        print(f"Dataset Shape: ({self.total_rows}, {len(header)})")
+        print("\nMissing Values:")
+        print(pd.Series(missing).reindex(self.columns, fill_value=0))
+
+    def dtypes(self):
+        dtypes = {c: 'category' for c in self.categorical_cols}
+        dtypes.update({c: np.float32 for c in self.numeric_cols if c != 'size'})
+        if 'size' in self.categorical_cols + self.numeric_cols:
+            dtypes['size'] = object
+        return dtypes
+
+    def quantile(self):
+        """Exact price quantile: count ranks through the histogram, then sort only the bins that hold them"""
+        n = self.valid_rows
+        h = (n - 1) * PRICE_QUANTILE
+        lo = int(np.floor(h))
+        cumulative = np.cumsum(self.price_hist)
+        first_bin = int(np.searchsorted(cumulative, lo + 1))
+        last_bin = int(np.searchsorted(cumulative, min(lo + 2, n)))
+        below = int(cumulative[first_bin - 1]) if first_bin > 0 else 0
+
+        candidates = []
+        for chunk in self.chunks(self.dtypes()):
+            prices = self.clean(chunk)[self.target_col].to_numpy(dtype=np.float64)
+            bins = price_bins(prices)
+            candidates.append(prices[(bins >= first_bin) & (bins <= last_bin)])
+        candidates = np.sort(np.concatenate(candidates))
+        a = candidates[lo - below]
+        b = candidates[min(lo - below + 1, len(candidates) - 1)]
+        self.q_high = lerp(a, b, h - lo)
+
+    def filtered_chunks(self):
+        for chunk in self.chunks(self.dtypes()):
+            chunk = self.clean(chunk)
+            yield chunk[chunk[self.target_col] <= self.q_high]
+
+    def stats(self):
+        counts = {c: Counter() for c in self.feature_names}
+        self.n_rows = 0
+        for chunk in self.filtered_chunks():
+            self.n_rows += len(chunk)
+            for col in self.feature_names:
+                value_counts = chunk[col].value_counts(dropna=True)
+                counts[col].update(value_counts[value_counts > 0].to_dict())
+        print(f"Data Cleaning: Removed {self.total_rows - self.n_rows} invalid/outlier rows. Remaining: {self.n_rows}")
+
+        self.fill_values = {}
+        self.label_encoders = {}
+        for col in self.numeric_cols:
+            self.fill_values[col] = median_from_counts(counts[col])
+        for col in self.categorical_cols:
+            mode = mode_from_counts(counts[col])
+            self.fill_values[col] = mode
+            vocabulary = {str(v) for v in counts[col]}
+            if sum(counts[col].values()) < self.n_rows:
+                vocabulary.add(str(mode))
+            le = LabelEncoder()
+            le.classes_ = np.array(sorted(vocabulary), dtype=object)
+            self.label_encoders[col] = le
+
+    def encode(self):
+        os.makedirs(self.store_dir, exist_ok=True)
+        X = np.lib.format.open_memmap(
+            os.path.join(self.store_dir, "X.npy"), mode='w+', dtype=np.float32,
+            shape=(self.n_rows, len(self.feature_names)),
+        )
+        y = np.lib.format.open_memmap(
+            os.path.join(self.store_dir, "y.npy"), mode='w+', dtype=np.float64, shape=(self.n_rows,),
+        )
+        row = 0
+        for chunk in self.filtered_chunks():
+            end = row + len(chunk)
+            for j, col in enumerate(self.feature_names):
+                if col in self.label_encoders:
+                    values = chunk[col].astype(object).where(chunk[col].notna(), self.fill_values[col]).astype(str)
+                    X[row:end, j] = pd.Categorical(values, categories=self.label_encoders[col].classes_).codes
+                else:
+                    X[row:end, j] = chunk[col].fillna(self.fill_values[col]).to_numpy(dtype=np.float32)
+            y[row:end] = chunk[self.target_col].to_numpy(dtype=np.float64)
+            row = end
+        X.flush()
+        y.flush()
+        # Reopen read-only so training pages the matrix in from disk as needed
+        self.X = np.load(os.path.join(self.store_dir, "X.npy"), mmap_mode='r')
+        self.y = np.load(os.path.join(self.store_dir, "y.npy"), mmap_mode='r')
+
+    def run(self):
+        with stage("scan", self.report):
+            self.scan()
+        with stage("quantile", self.report):
+            self.quantile()
+        with stage("stats", self.report):
+            self.stats()
+        with stage("encode", self.report):
+            self.encode()
+        return self.X, self.y, self.label_encoders, self.target_col, self.feature_names
+
+
+def preprocess_data_streaming(path, chunksize=100000, store_dir="backend/training_store"):
+    """Streaming equivalent of preprocess_data; X and y come back memory-mapped"""
+    return StreamingPreprocessor(path, chunksize, store_dir).run()
@@ -0,0 +1,54 @@
+"""CategoryTable must encode exactly like the pickled LabelEncoders it replaces."""
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import BACKEND_DIR
+from encoders import UnknownCategoryError, compile_encoders
+
+# Values no encoder was fitted on; LabelEncoder.transform raises for them, which serving mapped to 0
+UNSEEN = ["", "nan", "__unseen__"]
+
+
+@pytest.fixture(scope="module")
+def label_encoders():
+    return joblib.load(os.path.join(BACKEND_DIR, "models", "label_encoders.pkl"))
+
+
+def label_encoder_code(encoder, value):
+    try:
+        return int(encoder.transform([str(value)])[0])
+    except ValueError:
+        return 0
+
+
+def test_encode_matches_label_encoder(label_encoders):
+    tables = compile_encoders(label_encoders, "zero")
+    for name, encoder in label_encoders.items():
+        for value in list(encoder.classes_) + UNSEEN:
+            assert tables[name].encode(value) == label_encoder_code(encoder, value), (name, value)
+
+
+def test_encode_many_matches_label_encoder(label_encoders):
+    tables = compile_encoders(label_encoders, "zero")
+    for name, encoder in label_encoders.items():
+        expected = encoder.transform(encoder.classes_.astype(str))
+        assert np.array_equal(tables[name].encode_many(encoder.classes_), expected), name
+
+
+def test_encode_column_marks_unseen(label_encoders):
+    tables = compile_encoders(label_encoders, "zero")
+    for name, encoder in label_encoders.items():
+        values = pd.Series(list(encoder.classes_) + ["__unseen__"], dtype=object)
+        expected = list(encoder.transform(encoder.classes_.astype(str))) + [-1]
+        assert list(tables[name].encode_column(values)) == expected, name
+
+
+def test_error_policy_rejects_unseen(label_encoders):
+    tables = compile_encoders(label_encoders, "error")
+    name = next(iter(tables))
+    with pytest.raises(UnknownCategoryError):
+        tables[name].encode("__unseen__")
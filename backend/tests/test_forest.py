@@ -0,0 +1,108 @@
+"""The flat engine must predict exactly what the sklearn forest it was exported from predicts."""
+import os
+
+import joblib
+import numpy as np
+import pytest
+
+from artifacts import load_bundle, save_bundle
+from compact import quantize, rebuild
+from conftest import BACKEND_DIR
+from forest import APPLY_CHUNK_ROWS, export_forest
+
+
+@pytest.fixture(scope="module")
+def model():
+    return joblib.load(os.path.join(BACKEND_DIR, "models", "model.pkl"))
+
+
+@pytest.fixture(scope="module")
+def forest(model):
+    return export_forest(model)
+
+
+def split_range(forest, feature):
+    splits = forest.threshold[(forest.feature == feature) & np.isfinite(forest.threshold)]
+    return (splits.min(), splits.max()) if len(splits) else (0.0, 1.0)
+
+
+def random_rows(model, forest, n=2000, seed=0):
+    """Rows spanning the thresholds the trees actually split on"""
+    rng = np.random.default_rng(seed)
+    X = np.empty((n, model.n_features_in_))
+    for j in range(X.shape[1]):
+        low, high = split_range(forest, j)
+        X[:, j] = rng.uniform(low - 1, high + 1, size=n).round(1)
+    return X
+
+
+def assert_same(model, forest, X):
+    np.testing.assert_allclose(forest.predict(X), model.predict(X), rtol=1e-12)
+
+
+def test_random_rows(model, forest):
+    assert_same(model, forest, random_rows(model, forest))
+
+
+# sklearn rejects infinite input, so ±inf is compared with the largest finite float32, which takes
+# the same branch at every split
+@pytest.mark.parametrize("value, sklearn_value", [
+    (np.nan, np.nan),
+    (np.inf, np.finfo(np.float32).max),
+    (-np.inf, -np.finfo(np.float32).max),
+])
+def test_non_finite_values(model, forest, value, sklearn_value):
+    X = random_rows(model, forest, n=300, seed=1)
+    for j in range(X.shape[1]):
+        column, expected = X.copy(), X.copy()
+        column[::2, j] = value
+        expected[::2, j] = sklearn_value
+        np.testing.assert_allclose(forest.predict(column), model.predict(expected), rtol=1e-12)
+    expected = X.copy()
+    X[::3] = value
+    expected[::3] = sklearn_value
+    np.testing.assert_allclose(forest.predict(X), model.predict(expected), rtol=1e-12)
+
+
+def test_nan_size_from_the_api(model, forest):
+    # parse_size("nan sqft") is NaN, and the size reaches the forest as is
+    assert_same(model, forest, np.array([[2, 1, np.nan, 3, 2, 5]], dtype=np.float64))
+
+
+def test_threshold_boundaries(model, forest):
+    X = random_rows(model, forest, n=400, seed=2)
+    rng = np.random.default_rng(3)
+    for j in range(X.shape[1]):
+        thresholds = forest.threshold[(forest.feature == j) & np.isfinite(forest.threshold)]
+        if not len(thresholds):
+            continue
+        # sklearn compares float32 inputs, so probe each side of the threshold as float32
+        at = rng.choice(thresholds, size=len(X)).astype(np.float32)
+        for probe in (at, np.nextafter(at, np.float32(np.inf)), np.nextafter(at, np.float32(-np.inf))):
+            rows = X.copy()
+            rows[:, j] = probe
+            assert_same(model, forest, rows)
+
+
+def test_nan_rows_across_chunks(model, forest):
+    X = random_rows(model, forest, n=APPLY_CHUNK_ROWS * 2 + 7, seed=4)
+    X[APPLY_CHUNK_ROWS + 3, 2] = np.nan
+    assert_same(model, forest, X)
+
+
+def test_bundle_round_trip(model, forest, tmp_path):
+    save_bundle(str(tmp_path / "bundle"), forest, {}, {"feature_names": []})
+    loaded, _, _ = load_bundle(str(tmp_path / "bundle"))
+    X = random_rows(model, forest, n=200, seed=5)
+    X[::4, 2] = np.nan
+    assert_same(model, loaded, X)
+
+
+def test_compaction_keeps_missing_direction(model, forest):
+    X = random_rows(model, forest, n=200, seed=6)
+    X[::4, 2] = np.nan
+    # Full depth and all trees, so compaction must not change a single prediction
+    rebuilt = rebuild(forest, range(forest.n_trees))
+    assert_same(model, rebuilt, X)
+    quantized = quantize(rebuilt, [], value_dtype="float64")
+    np.testing.assert_array_equal(quantized.apply(X), rebuilt.apply(X))
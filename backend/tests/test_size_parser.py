@@ -0,0 +1,93 @@
+"""parse_size against hand-written values and the parsers it replaced."""
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from size_parser import parse_size, parse_size_column
+
+EXPECTED = [
+    ("1200 sqft", 1200.0),
+    ("1200", 1200.0),
+    ("1200.5 SQFT", 1200.5),
+    ("  850sqft  ", 850.0),
+    ("799-1258 sqft", 1028.5),
+    ("799 - 1258", 1028.5),
+    ("1-2-3", 1.5),  # only the first two parts of a range count
+    (".5", 0.5),
+    ("+7", 7.0),
+    ("5e3", 5000.0),
+    ("1_000", 1000.0),  # float() accepts digit separators
+    ("inf", math.inf),
+    ("-5", 0),  # an empty range start
+    ("5e-3", 0),  # read as the range "5e" to "3"
+    (" 1,200 sqft", 0),
+    ("12 00", 0),
+    ("n/a", 0),
+    ("sqft", 0),
+    ("", 0),
+    ("   ", 0),
+    (None, 0),
+    (np.nan, 0),
+    (1200, 0),  # only strings are parsed
+]
+
+
+def baseline_training_parse(size_str):
+    """train_model.preprocess_data's inline parser before the shared one"""
+    if not isinstance(size_str, str):
+        return 0
+    try:
+        size_str = size_str.lower().replace('sqft', '').strip()
+        if not size_str:
+            return 0
+        if '-' in size_str:
+            parts = size_str.split('-')
+            val1 = float(parts[0].strip())
+            val2 = float(parts[1].strip())
+            return (val1 + val2) / 2
+        return float(size_str)
+    except:
+        return 0
+
+
+def baseline_serving_parse(value):
+    """/predict's inline parser before the shared one (request sizes are always strings)"""
+    try:
+        clean_val = value.lower().replace('sqft', '').strip()
+        if '-' in clean_val:
+            parts = clean_val.split('-')
+            return (float(parts[0].strip()) + float(parts[1].strip())) / 2
+        return float(clean_val)
+    except:
+        return 0
+
+
+def random_sizes(n=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    sizes = []
+    for _ in range(n):
+        low = int(rng.integers(100, 5000))
+        sizes.append(str(rng.choice([f"{low} sqft", f"{low}-{low + rng.integers(1, 900)} sqft", f"{low / 7:.2f}"])))
+    return sizes
+
+
+@pytest.mark.parametrize("value, expected", EXPECTED)
+def test_expected_values(value, expected):
+    assert parse_size(value) == expected
+
+
+def test_matches_baseline_parsers():
+    values = [v for v, _ in EXPECTED] + random_sizes()
+    for value in values:
+        assert parse_size(value) == baseline_training_parse(value), value
+        if isinstance(value, str):
+            assert parse_size(value) == baseline_serving_parse(value), value
+
+
+def test_column_matches_scalar():
+    values = [v for v, _ in EXPECTED] + random_sizes()
+    column = parse_size_column(pd.Series(values, dtype=object, name="size"))
+    assert column.name == "size"
+    assert column.tolist() == [float(parse_size(v)) for v in values]
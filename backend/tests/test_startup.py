@@ -0,0 +1,139 @@
+"""Importing and starting the API must stay within its time budget.
+
+Two measurements, each the best of STARTUP_REPEAT fresh processes:
+
+1. ``python -X importtime -c "import main"``: the cumulative import
+   time of main. None of FORBIDDEN may be imported eagerly. Those modules
+   are deliberately deferred: NumPy to the model loader thread, pandas to
+   training, joblib/sklearn to the pickle fallback, google-auth to
+   /google-login, python-jose to the first token issued or verified.
+2. uvicorn started as a subprocess on a free port: time from spawn
+   until /healthz answers (the worker is serving), and until /ready
+   returns 200 (the model is loaded).
+
+Budgets can be tightened or relaxed per machine from the environment,
+so the tests can gate a deploy next to benchmarks/run.py --compare:
+
+    STARTUP_READY_BUDGET_MS=4000 python -m pytest backend/tests/test_startup.py
+"""
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from conftest import BACKEND_DIR
+
+IMPORT_BUDGET_MS = float(os.environ.get("STARTUP_IMPORT_BUDGET_MS", 1200))
+HEALTHY_BUDGET_MS = float(os.environ.get("STARTUP_HEALTHY_BUDGET_MS", 2500))
+READY_BUDGET_MS = float(os.environ.get("STARTUP_READY_BUDGET_MS", 4000))
+REPEAT = int(os.environ.get("STARTUP_REPEAT", 3))
+TIMEOUT = 60
+FORBIDDEN = ["numpy", "pandas", "sklearn", "joblib", "google.oauth2", "jose"]
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def child_env():
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "startup.db"))
+    return env
+
+
+def measure_import():
+    """(import ms for main, names of every module imported)"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, env=child_env(), capture_output=True, text=True,
+    )
+    assert result.returncode == 0, f"import main failed:\n{result.stderr[-2000:]}"
+    modules = set()
+    total_us = None
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        _, cumulative_us, _, name = match.groups()
+        modules.add(name)
+        if name == "main":
+            total_us = int(cumulative_us)
+    return total_us / 1000, modules
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def get_status(url):
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return None
+
+
+def measure_startup():
+    """(ms until /healthz is 200, ms until /ready is 200) for a fresh uvicorn worker"""
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=child_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    healthy_ms = ready_ms = None
+    try:
+        while time.perf_counter() - start < TIMEOUT:
+            assert server.poll() is None, f"uvicorn exited with code {server.returncode}"
+            if healthy_ms is None and get_status(base + "/healthz") == 200:
+                healthy_ms = (time.perf_counter() - start) * 1000
+            if healthy_ms is not None and get_status(base + "/ready") == 200:
+                ready_ms = (time.perf_counter() - start) * 1000
+                break
+            time.sleep(0.01)
+    finally:
+        server.terminate()
+        server.wait(10)
+    return healthy_ms, ready_ms
+
+
+@pytest.fixture(scope="module")
+def imports():
+    return [measure_import() for _ in range(REPEAT)]
+
+
+@pytest.fixture(scope="module")
+def startups():
+    return [measure_startup() for _ in range(REPEAT)]
+
+
+def test_import_time(imports):
+    import_ms = min(ms for ms, _ in imports)
+    assert import_ms <= IMPORT_BUDGET_MS, f"import main took {import_ms:.0f} ms"
+
+
+def test_deferred_modules_not_imported(imports):
+    _, modules = imports[0]
+    loaded = sorted(name for name in modules if any(name == f or name.startswith(f + ".") for f in FORBIDDEN))
+    assert not loaded, f"import main loaded deferred modules: {', '.join(loaded)}"
+
+
+def test_healthy_time(startups):
+    healthy_ms = min((h for h, _ in startups if h is not None), default=None)
+    assert healthy_ms is not None, f"/healthz didn't answer within {TIMEOUT}s"
+    assert healthy_ms <= HEALTHY_BUDGET_MS, f"/healthz took {healthy_ms:.0f} ms"
+
+
+def test_ready_time(startups):
+    ready_ms = min((r for _, r in startups if r is not None), default=None)
+    assert ready_ms is not None, f"/ready didn't return 200 within {TIMEOUT}s"
+    assert ready_ms <= READY_BUDGET_MS, f"/ready took {ready_ms:.0f} ms"
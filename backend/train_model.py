@@ -5,15 +5,21 @@ from sklearn.ensemble import RandomForestRegressor
 from sklearn.preprocessing import LabelEncoder
 from sklearn.metrics import mean_absolute_error, r2_score
 import joblib
+import argparse
 import os
 
+from forest import export_forest
+from artifacts import save_bundle
+from registry import publish
+from size_parser import parse_size_column
+
 # Dataset path
 DATASET_PATH = r"C:\Users\priya\.cache\kagglehub\datasets\shubhammkumaar\real-estate-listings-and-prices-in-india-2025\versions\1\real_estate_dataset.csv"
 MODEL_DIR = "backend/models"
 
-def load_and_explore_data():
+def load_and_explore_data(path=None):
     """Load and explore the dataset"""
-    df = pd.read_csv(DATASET_PATH)
+    df = pd.read_csv(path or DATASET_PATH)
     print("Dataset Shape:", df.shape)
     print("\nColumn Names:")
     print(df.columns.tolist())
@@ -29,6 +35,10 @@ def load_and_explore_data():
 
 def preprocess_data(df):
     """Preprocess the dataset"""
+    return encode_data(*clean_data(df))
+
+def clean_data(df):
+    """Drop unused columns, parse size and remove invalid/outlier rows; returns (df, target column)"""
     # Make a copy
     df = df.copy()
     
@@ -39,27 +49,9 @@ def preprocess_data(df):
     print("\nColumns after dropping irrelevant ones:", df.columns.tolist())
     
     # Process 'size' column before encoding
-    def parse_size(size_str):
-        if not isinstance(size_str, str):
-            return 0
-        try:
-            # Remove 'sqft' and whitespace
-            size_str = size_str.lower().replace('sqft', '').strip()
-            if not size_str:
-                return 0
-            # Handle ranges (e.g., "799-1258")
-            if '-' in size_str:
-                parts = size_str.split('-')
-                val1 = float(parts[0].strip())
-                val2 = float(parts[1].strip())
-                return (val1 + val2) / 2
-            return float(size_str)
-        except:
-            return 0
-
     if 'size' in df.columns:
         print("Parsing 'size' column to numerical...")
-        df['size'] = df['size'].apply(parse_size)
+        df['size'] = parse_size_column(df['size'])
     
     # Identify target column
     target_col = None
@@ -89,7 +81,10 @@ def preprocess_data(df):
     df = df[df[target_col] <= q_high]
     
     print(f"Data Cleaning: Removed {initial_count - len(df)} invalid/outlier rows. Remaining: {len(df)}")
-    
+    return df, target_col
+
+def encode_data(df, target_col):
+    """Fill missing values and label-encode the cleaned rows; returns (X, y, label_encoders, target column)"""
     # Separate features and target
     X = df.drop(columns=[target_col])
     y = df[target_col]
@@ -116,14 +111,21 @@ def preprocess_data(df):
     
     return X, y, label_encoders, target_col
 
-def train_model(X, y):
+def train_model(X, y, feature_names=None, search=False, folds=5, workers=None, store_dir="backend/training_store",
+                params=None):
     """Train the Random Forest model"""
     # Split data
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
     
+    params = {"n_estimators": 100, **(params or {})}
+    if search:
+        # Cross-validated on the training split only; the test split stays a true holdout
+        from model_search import search as search_params
+        params, _ = search_params(X_train, y_train, store_dir, n_folds=folds, workers=workers)
+    
     # Train model
-    print("\nTraining Random Forest model...")
-    model = RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=-1)
+    print(f"\nTraining Random Forest model with {params}...")
+    model = RandomForestRegressor(random_state=42, n_jobs=-1, **params)
     model.fit(X_train, y_train)
     
     # Evaluate
@@ -135,10 +137,10 @@ def train_model(X, y):
     print(f"Mean Absolute Error: {mae:,.2f}")
     print(f"R² Score: {r2:.4f}")
     
-    return model, X.columns.tolist()
+    return model, feature_names or X.columns.tolist()
 
-def save_artifacts(model, label_encoders, feature_names, target_col):
-    """Save model and encoders"""
+def save_artifacts(model, label_encoders, feature_names, target_col, mapping=None):
+    """Save model and encoders; mapping is the neighborhood map published with them"""
     os.makedirs(MODEL_DIR, exist_ok=True)
     
     # Save model
@@ -156,27 +158,72 @@ def save_artifacts(model, label_encoders, feature_names, target_col):
     }
     joblib.dump(metadata, f"{MODEL_DIR}/metadata.pkl")
     print(f"Metadata saved to {MODEL_DIR}/metadata.pkl")
+    
+    forest = export_forest(model)
+    # The unversioned bundle, served when there is no registry, and read by benchmarks/synthetic.py
+    save_bundle(f"{MODEL_DIR}/bundle", forest, label_encoders, metadata, mapping)
+    print(f"Serving bundle saved to {MODEL_DIR}/bundle")
+
+    # Publish a new version of the memory-mappable bundle used by the flat serving engine.
+    # Servers watching the registry (or sent POST /admin/model/reload) swap it in without a restart.
+    # An unchanged model (e.g. the pipeline's fit was cached) reuses the newest version.
+    version = publish(f"{MODEL_DIR}/registry", forest, label_encoders, metadata, mapping)
+    print(f"Serving bundle published to {MODEL_DIR}/registry as version {version}")
 
 if __name__ == "__main__":
-    print("="*50)
-    print("STEP 1: Loading and Exploring Data")
-    print("="*50)
-    df = load_and_explore_data()
-    
-    print("\n" + "="*50)
-    print("STEP 2: Preprocessing Data")
-    print("="*50)
-    X, y, label_encoders, target_col = preprocess_data(df)
-    
-    print("\n" + "="*50)
-    print("STEP 3: Training Model")
-    print("="*50)
-    model, feature_names = train_model(X, y)
-    
-    print("\n" + "="*50)
-    print("STEP 4: Saving Artifacts")
-    print("="*50)
-    save_artifacts(model, label_encoders, feature_names, target_col)
+    parser = argparse.ArgumentParser(description="Train the land price model")
+    parser.add_argument("--data", default=DATASET_PATH, help="listings CSV")
+    parser.add_argument("--chunksize", type=int, default=0,
+                        help="stream the CSV in chunks of this many rows (for files larger than RAM)")
+    parser.add_argument("--store-dir", default="backend/training_store",
+                        help="where streaming mode and --search write their memory-mapped training matrices")
+    parser.add_argument("--cache-dir", default=None,
+                        help="stage cache of the artifact pipeline (default: <store-dir>/cache)")
+    parser.add_argument("--search", action="store_true",
+                        help="pick forest size/depth/leaf settings by parallel k-fold CV, accuracy and latency")
+    parser.add_argument("--folds", type=int, default=5, help="cross-validation folds for --search")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes for --search (default: CPU count)")
+    parser.add_argument("--n-estimators", type=int, default=None, help="forest size (default 100)")
+    parser.add_argument("--max-depth", type=int, default=None)
+    parser.add_argument("--min-samples-leaf", type=int, default=None)
+    args = parser.parse_args()
+    DATASET_PATH = args.data
+    params = {
+        name: value for name, value in
+        [("n_estimators", args.n_estimators), ("max_depth", args.max_depth), ("min_samples_leaf", args.min_samples_leaf)]
+        if value is not None
+    }
+
+    if not args.chunksize:
+        # load -> clean -> encode -> fit -> save (+ the neighborhood map), skipping stages whose inputs haven't changed
+        from pipeline import build_artifacts
+
+        build_artifacts(
+            args.data, args.cache_dir or os.path.join(args.store_dir, "cache"), params=params,
+            search=args.search, folds=args.folds, workers=args.workers, store_dir=args.store_dir,
+        )
+    else:
+        from streaming_preprocess import preprocess_data_streaming
+
+        print("="*50)
+        print("STEP 1-2: Streaming Preprocessing")
+        print("="*50)
+        X, y, label_encoders, target_col, feature_names = preprocess_data_streaming(
+            args.data, args.chunksize, args.store_dir
+        )
+
+        print("\n" + "="*50)
+        print("STEP 3: Training Model")
+        print("="*50)
+        model, feature_names = train_model(
+            X, y, feature_names, search=args.search, folds=args.folds, workers=args.workers,
+            store_dir=args.store_dir, params=params,
+        )
+
+        print("\n" + "="*50)
+        print("STEP 4: Saving Artifacts")
+        print("="*50)
+        save_artifacts(model, label_encoders, feature_names, target_col)
     
     print("\n" + "="*50)
     print("TRAINING COMPLETE!")